@@ -0,0 +1,163 @@
+import threading
+import time
+import urllib.error
+from collections import deque
+
+from src.asgi_wsgi_constants import (
+    BREAKER_FAILURE_RATE,
+    BREAKER_HALF_OPEN_PROBES,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_SLOW_CALL,
+    BREAKER_WINDOW,
+    UPSTREAM_BUDGET,
+)
+from src.asgi_wsgi_utils import fetch_upstream_bytes
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window_seconds: float = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.opened_at = 0.0
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+            # (время, неуспех, медленный) для скользящего окна
+            self.window: deque[tuple[float, bool, bool]] = deque()
+            self.counters = {
+                "calls": 0,
+                "failures": 0,
+                "slow_calls": 0,
+                "rejected": 0,
+                "opened": 0,
+            }
+
+    def before_call(self):
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError("Upstream circuit is open")
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+                self.probe_successes = 0
+
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError("Upstream circuit is half-open")
+                self.probes_in_flight += 1
+
+    def record(self, success: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        with self.lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += not success
+            self.counters["slow_calls"] += slow
+
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if not success or slow:
+                    self.trip(now)
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self.state = self.CLOSED
+                    self.window.clear()
+                return
+
+            if self.state == self.OPEN:
+                return
+
+            self.window.append((now, not success, slow))
+            while self.window and self.window[0][0] < now - self.window_seconds:
+                self.window.popleft()
+
+            calls = len(self.window)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, failed, _ in self.window if failed)
+            slow_calls = sum(1 for _, _, is_slow in self.window if is_slow)
+            if max(failures, slow_calls) / calls >= self.failure_rate:
+                self.trip(now)
+
+    def trip(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.window.clear()
+        self.counters["opened"] += 1
+
+    def call(self, fetch, *args):
+        self.before_call()
+        start = time.monotonic()
+        try:
+            status, body = fetch(*args)
+        except BaseException:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(status < 500, time.monotonic() - start)
+        return status, body
+
+    async def call_async(self, factory):
+        self.before_call()
+        start = time.monotonic()
+        try:
+            status, body = await factory()
+        except BaseException:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(status < 500, time.monotonic() - start)
+        return status, body
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            state = self.state
+            if state == self.OPEN and (
+                time.monotonic() - self.opened_at >= self.open_seconds
+            ):
+                state = self.HALF_OPEN
+            calls = len(self.window)
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failures": sum(1 for _, failed, _ in self.window if failed),
+                "window_slow_calls": sum(1 for _, _, slow in self.window if slow),
+                **self.counters,
+            }
+
+
+upstream_breaker = CircuitBreaker()
+
+UPSTREAM_SYNC_ERRORS = (urllib.error.URLError, TimeoutError, CircuitOpenError)
+
+
+def guarded_fetch_upstream_bytes(code: str) -> tuple[int, bytes]:
+    return upstream_breaker.call(fetch_upstream_bytes, code, UPSTREAM_BUDGET)
@@ -1,10 +1,60 @@
-PROVIDER = "https://api.exchangerate-api.com"
+import os
+
+PROVIDER = os.getenv("RATES_PROVIDER", "https://api.exchangerate-api.com")
 
 TIMEOUT = 10
 
+# Общий пул keep-alive соединений к провайдеру для ASGI-приложения
+UPSTREAM_CONCURRENCY = 100
+UPSTREAM_KEEPALIVE = 30
+
+# Бюджет времени на один запрос к провайдеру и настройки предохранителя:
+# при доле ошибок/медленных ответов в окне выше порога запросы к провайдеру
+# прекращаются на BREAKER_OPEN_SECONDS, затем пропускаются пробные
+UPSTREAM_BUDGET = 2.0
+BREAKER_WINDOW = 30
+BREAKER_MIN_CALLS = 10
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_SLOW_CALL = 1.0
+BREAKER_OPEN_SECONDS = 5
+BREAKER_HALF_OPEN_PROBES = 2
+HEALTH_PATH = "/health"
+
+# Режим кросс-курсов: один базовый запрос к провайдеру на интервал обновления,
+# остальные таблицы считаются локально делением на курс нужной валюты.
+CROSS_RATES_MODE = os.getenv("CROSS_RATES_MODE", "0") == "1"
+BASE_CURRENCY = "USD"
+REFRESH_INTERVAL = 60 * 60
+# после неудачного обновления следующая попытка не раньше чем через столько секунд
+REFRESH_RETRY_INTERVAL = 30
+CROSS_RATE_TOLERANCE = 5e-3
+
+# Ответы с курсами можно кешировать только с перепроверкой по ETag
+RATES_CACHE_CONTROL = "no-cache"
+GZIP_MIN_SIZE = 1024
+
+# Пакетный запрос: /rates?bases=USD,EUR&symbols=GBP,JPY
+BATCH_PATH = "/rates"
+MAX_BATCH_BASES = 50
+BATCH_CONCURRENCY = 20
+
+# Встроенный сервер (python -m src.asgi_wsgi_server)
+SERVER_BACKLOG = 2048
+SERVER_THREADS = 32
+SERVER_KEEPALIVE_TIMEOUT = 5
+SERVER_GRACEFUL_TIMEOUT = 30
+# больше - ответ 431/413 и закрытие соединения
+SERVER_MAX_HEADER_SIZE = 64 * 1024
+SERVER_MAX_BODY_SIZE = 1024 * 1024
+
 ERROR_MESSAGES = {
     "method_not_allowed": "Method Not Allowed",
     "invalid_path": "Use /<3-letter-currency>, e.g. /USD",
     "bad_gateway": "Bad Gateway: provider unreachable",
+    "upstream_unavailable": "Service Unavailable: provider circuit is open",
     "unsupported_scope_type": "Unsupported scope type",
+    "unsupported_code": "Unsupported currency code",
+    "invalid_batch_query": (
+        f"Use /rates?bases=USD,EUR[&symbols=GBP,JPY], at most {MAX_BATCH_BASES} bases"
+    ),
 }
@@ -0,0 +1,150 @@
+import json
+import math
+import threading
+import time
+
+from src.asgi_wsgi_breaker import (
+    UPSTREAM_SYNC_ERRORS,
+    guarded_fetch_upstream_bytes,
+)
+from src.asgi_wsgi_constants import (
+    BASE_CURRENCY,
+    CROSS_RATE_TOLERANCE,
+    REFRESH_INTERVAL,
+    REFRESH_RETRY_INTERVAL,
+)
+from src.asgi_wsgi_utils import fetch_upstream_bytes
+
+
+class UpstreamHTTPError(Exception):
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"Upstream HTTP {status}")
+        self.status = status
+        self.body = body
+
+
+def round_rate(value: float) -> float:
+    # провайдер отдаёт курсы с 4-6 значащими цифрами, больше хранить незачем
+    return float(f"{value:.6g}")
+
+
+def derive_cross_tables(base_table: dict) -> dict[str, bytes]:
+    rates = base_table["rates"]
+    tables = {}
+    for code, base_rate in rates.items():
+        if not base_rate:
+            continue
+        table = dict(base_table)
+        table["base"] = code
+        table["rates"] = {
+            other: 1 if other == code else round_rate(rate / base_rate)
+            for other, rate in rates.items()
+        }
+        tables[code] = json.dumps(
+            table, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+    return tables
+
+
+class CrossRateCache:
+    def __init__(
+        self,
+        base: str = BASE_CURRENCY,
+        refresh_interval: float = REFRESH_INTERVAL,
+        retry_interval: float = REFRESH_RETRY_INTERVAL,
+    ):
+        self.base = base
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.tables: dict[str, bytes] = {}
+        self.updated_at: float | None = None
+        self.retry_at: float | None = None
+        self.lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        now = time.monotonic()
+        if self.retry_at is not None and now < self.retry_at:
+            return False
+        return self.updated_at is None or now - self.updated_at >= self.refresh_interval
+
+    def get(self, code: str) -> bytes | None:
+        return self.tables.get(code)
+
+    def update(self, body: bytes):
+        self.tables = derive_cross_tables(json.loads(body))
+        self.updated_at = time.monotonic()
+        self.retry_at = None
+
+    def postpone(self):
+        # провайдер недоступен: до retry_at отдаём прежние таблицы без попыток
+        self.retry_at = time.monotonic() + self.retry_interval
+
+    def apply_refresh(self, status: int, body: bytes):
+        if status == 200:
+            self.update(body)
+        elif self.tables:
+            self.postpone()
+        else:
+            raise UpstreamHTTPError(status, body)
+
+    def ensure_fresh(self, fetch=guarded_fetch_upstream_bytes):
+        if not self.is_stale():
+            return
+
+        if self.tables:
+            # обновляет один поток, остальные сразу отдают прежние таблицы
+            if not self.lock.acquire(blocking=False):
+                return
+        else:
+            self.lock.acquire()
+
+        try:
+            if not self.is_stale():
+                return
+
+            try:
+                status, body = fetch(self.base)
+            except UPSTREAM_SYNC_ERRORS:
+                # пока провайдер недоступен, отдаём последние известные курсы
+                if self.tables:
+                    self.postpone()
+                    return
+                raise
+
+            self.apply_refresh(status, body)
+        finally:
+            self.lock.release()
+
+
+cross_rate_cache = CrossRateCache()
+
+
+def verify_cross_rates(
+    codes: list[str], rel_tol: float = CROSS_RATE_TOLERANCE, fetch=fetch_upstream_bytes
+) -> list[tuple[str, str, float, float]]:
+    cache = CrossRateCache()
+    cache.ensure_fresh(fetch)
+
+    mismatches = []
+    for code in codes:
+        status, body = fetch(code)
+        if status != 200:
+            raise UpstreamHTTPError(status, body)
+        direct = json.loads(body)["rates"]
+        derived = json.loads(cache.get(code))["rates"]
+
+        for symbol, expected in direct.items():
+            actual = derived.get(symbol)
+            if actual is None or not math.isclose(actual, expected, rel_tol=rel_tol):
+                mismatches.append((code, symbol, expected, actual))
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    checked = ["USD", "EUR", "GBP", "JPY", "RUB", "CNY", "CHF", "KZT"]
+    result = verify_cross_rates(checked)
+    for code, symbol, expected, actual in result:
+        print(f"{code}->{symbol}: upstream={expected} derived={actual}")
+    assert not result, f"{len(result)} cross rates out of tolerance"
+    print(f"Cross rates for {', '.join(checked)} match upstream tables")
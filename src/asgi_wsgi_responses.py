@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+
+from src.asgi_wsgi_constants import GZIP_MIN_SIZE, RATES_CACHE_CONTROL
+
+
+def to_asgi_headers(headers: list[tuple[str, str]]) -> list[tuple[bytes, bytes]]:
+    return [(k.lower().encode(), v.encode()) for k, v in headers]
+
+
+class PreparedBody:
+    """Тело ответа с ETag, gzip-вариантом и заранее собранными заголовками."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = (
+            gzip.compress(body, compresslevel=6, mtime=0)
+            if len(body) >= GZIP_MIN_SIZE
+            else None
+        )
+
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etags = {False: f'"{digest}"', True: f'"{digest}-gzip"'}
+
+        # ключ словарей - отдаём ли gzip-вариант
+        self.wsgi_headers = {}
+        self.wsgi_not_modified_headers = {}
+        for use_gzip, etag in self.etags.items():
+            common = [
+                ("Cache-Control", RATES_CACHE_CONTROL),
+                ("ETag", etag),
+                ("Vary", "Accept-Encoding"),
+            ]
+            payload = self.gzip_body if use_gzip else body
+            content = [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(payload or b""))),
+            ]
+            if use_gzip:
+                content.append(("Content-Encoding", "gzip"))
+            self.wsgi_headers[use_gzip] = content + common
+            self.wsgi_not_modified_headers[use_gzip] = common
+
+        self.asgi_headers = {
+            k: to_asgi_headers(v) for k, v in self.wsgi_headers.items()
+        }
+        self.asgi_not_modified_headers = {
+            k: to_asgi_headers(v) for k, v in self.wsgi_not_modified_headers.items()
+        }
+
+    def use_gzip(self, accept_encoding: str) -> bool:
+        return self.gzip_body is not None and accepts_gzip(accept_encoding)
+
+    def payload(self, use_gzip: bool) -> bytes:
+        return self.gzip_body if use_gzip else self.body
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match сравнивается слабо: W/"x" совпадает с "x"
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags.values())
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class PreparedBodyCache:
+    """Подготовленные ответы по коду валюты; пересобираются только при смене тела."""
+
+    def __init__(self):
+        self.entries: dict[str, PreparedBody] = {}
+
+    def get(self, code: str) -> PreparedBody | None:
+        return self.entries.get(code)
+
+    def prepare(self, code: str, body: bytes) -> PreparedBody:
+        entry = self.entries.get(code)
+        if entry is None or (entry.body is not body and entry.body != body):
+            entry = PreparedBody(body)
+            self.entries[code] = entry
+        return entry
+
+
+prepared_bodies = PreparedBodyCache()
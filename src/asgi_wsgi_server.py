@@ -0,0 +1,859 @@
+import argparse
+import asyncio
+import importlib
+import inspect
+import io
+import multiprocessing
+import os
+import queue
+import random
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from src.asgi_wsgi_constants import (
+    SERVER_BACKLOG,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_KEEPALIVE_TIMEOUT,
+    SERVER_MAX_BODY_SIZE,
+    SERVER_MAX_HEADER_SIZE,
+    SERVER_THREADS,
+)
+
+
+class RequestError(Exception):
+    """Запрос, который не обрабатываем: отвечаем status и закрываем соединение."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def make_listen_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # каждый воркер слушает свой сокет на том же порту, ядро делит соединения
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(SERVER_BACKLOG)
+    return sock
+
+
+def get_reason(status: int) -> bytes:
+    try:
+        return HTTPStatus(status).phrase.encode()
+    except ValueError:
+        return b""
+
+
+def parse_request_line(line: bytes) -> tuple[str, str, str]:
+    try:
+        method, target, version = line.decode("latin-1").rstrip().split(" ", 2)
+    except ValueError:
+        raise RequestError(400) from None
+    return method, target, version
+
+
+def parse_header_line(line: bytes) -> tuple[bytes, bytes]:
+    name, _, value = line.decode("latin-1").partition(":")
+    return name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")
+
+
+def get_content_length(headers) -> int:
+    lengths = set()
+    for name, value in headers:
+        if name == b"transfer-encoding":
+            # chunked-тело запроса не разбираем; без отказа его приняли бы
+            # за следующий запрос в соединении
+            raise RequestError(501)
+        if name == b"content-length":
+            lengths.add(value)
+    if not lengths:
+        return 0
+    value = lengths.pop()
+    if lengths or not value.isdigit():
+        raise RequestError(400)
+    length = int(value)
+    if length > SERVER_MAX_BODY_SIZE:
+        raise RequestError(413)
+    return length
+
+
+def wants_close(headers) -> bool:
+    return any(k == b"connection" and v.lower() == b"close" for k, v in headers)
+
+
+def encode_chunk(chunk: bytes) -> bytes:
+    return b"%x\r\n%s\r\n" % (len(chunk), chunk)
+
+
+def has_body(method: str, status: int) -> bool:
+    # у ответов на HEAD и 1xx/204/304 тела нет: ни данных, ни chunked-рамки
+    return method != "HEAD" and status >= 200 and status not in (204, 304)
+
+
+def make_head(status: int, headers) -> bytes:
+    head = [b"HTTP/1.1 %d %s" % (status, get_reason(status))]
+    head.extend(name + b": " + value for name, value in headers)
+    return b"\r\n".join(head) + b"\r\n\r\n"
+
+
+def make_error_response(status: int) -> bytes:
+    body = get_reason(status)
+    headers = [
+        (b"content-type", b"text/plain; charset=utf-8"),
+        (b"content-length", b"%d" % len(body)),
+        (b"connection", b"close"),
+    ]
+    return make_head(status, headers) + body
+
+
+def parse_request(buffer: bytearray):
+    """Забирает из буфера один полный запрос или возвращает None."""
+    while buffer.startswith(b"\r\n"):
+        del buffer[:2]
+    head_end = buffer.find(b"\r\n\r\n")
+    if head_end == -1:
+        if len(buffer) > SERVER_MAX_HEADER_SIZE:
+            raise RequestError(431)
+        return None
+    if head_end > SERVER_MAX_HEADER_SIZE:
+        raise RequestError(431)
+
+    lines = bytes(buffer[:head_end]).split(b"\r\n")
+    method, target, version = parse_request_line(lines[0])
+    headers = [parse_header_line(line) for line in lines[1:] if line]
+
+    body_start = head_end + 4
+    body_end = body_start + get_content_length(headers)
+    if len(buffer) < body_end:
+        return None
+    body = bytes(buffer[body_start:body_end])
+    del buffer[:body_end]
+    return method, target, version, headers, body
+
+
+async def read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readline()
+    except ValueError:
+        # строка длиннее лимита буфера StreamReader
+        raise RequestError(431) from None
+
+
+async def read_request(reader: asyncio.StreamReader):
+    request_line = await read_line(reader)
+    if not request_line.strip():
+        return None
+
+    method, target, version = parse_request_line(request_line)
+    headers = []
+    size = len(request_line)
+    while True:
+        line = await read_line(reader)
+        size += len(line)
+        if size > SERVER_MAX_HEADER_SIZE:
+            raise RequestError(431)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        headers.append(parse_header_line(line))
+
+    length = get_content_length(headers)
+    body = await reader.readexactly(length) if length else b""
+    return method, target, version, headers, body
+
+
+def retire(worker):
+    # под мастером воркер дорабатывает, пока замена не начнёт слушать порт
+    if worker.notify:
+        worker.notify("retire")
+    else:
+        worker.stop()
+
+
+class Connection:
+    def __init__(self, sock: socket.socket, addr):
+        self.sock = sock
+        self.addr = addr
+        self.buffer = bytearray()
+        self.request = None
+        self.idle_since = time.monotonic()
+
+    def receive(self) -> bool:
+        """Дочитывает пришедшие данные; False, если клиент закрыл соединение."""
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        self.buffer += data
+        return True
+
+
+class WSGIWorker:
+    """HTTP/1.1 keep-alive фронт для WSGI-приложения на пуле потоков.
+
+    Поток из пула занят только на время запроса: запрос читает основной
+    поток по мере прихода данных, а простаивающие keep-alive соединения
+    ждут в его селекторе. Недочитанный за keepalive_timeout запрос
+    получает 408.
+    """
+
+    def __init__(
+        self,
+        app,
+        sock: socket.socket,
+        threads: int = SERVER_THREADS,
+        max_requests: int = 0,
+        keepalive_timeout: float = SERVER_KEEPALIVE_TIMEOUT,
+        graceful_timeout: float = SERVER_GRACEFUL_TIMEOUT,
+        multiprocess: bool = False,
+        notify=None,
+    ):
+        self.app = app
+        self.sock = sock
+        self.threads = threads
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.multiprocess = multiprocess
+        # notify(event) сообщает мастеру о готовности и исчерпании лимита запросов
+        self.notify = notify
+        self.server_name, self.server_port = sock.getsockname()[:2]
+        self.stopping = threading.Event()
+        self.handled = 0
+        self.lock = threading.Lock()
+        self.connections: set[Connection] = set()
+        self.returned: queue.SimpleQueue[Connection] = queue.SimpleQueue()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def count_request(self):
+        with self.lock:
+            self.handled += 1
+            if self.max_requests and self.handled == self.max_requests:
+                retire(self)
+
+    def accept_pending(self, selector):
+        while True:
+            try:
+                sock, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.settimeout(self.keepalive_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(sock, addr)
+            self.connections.add(conn)
+            selector.register(sock, selectors.EVENT_READ, conn)
+
+    def close_connection(self, conn: Connection):
+        self.connections.discard(conn)
+        conn.sock.close()
+
+    def reject(self, conn: Connection, status: int):
+        # короткий ответ без ожидания: клиент, который не читает, не задержит поток
+        conn.sock.setblocking(False)
+        try:
+            conn.sock.send(make_error_response(status))
+        except OSError:
+            pass
+        self.close_connection(conn)
+
+    def close_idle(self, selector, timeout: float):
+        now = time.monotonic()
+        for key in list(selector.get_map().values()):
+            conn = key.data
+            if isinstance(conn, Connection) and now - conn.idle_since >= timeout:
+                selector.unregister(conn.sock)
+                if conn.buffer:
+                    self.reject(conn, 408)
+                else:
+                    self.close_connection(conn)
+
+    def read_connection(self, selector, conn: Connection, executor):
+        # в пул уходит только полностью пришедший запрос
+        try:
+            if conn.receive():
+                conn.request = parse_request(conn.buffer)
+            else:
+                selector.unregister(conn.sock)
+                self.close_connection(conn)
+                return
+        except RequestError as e:
+            selector.unregister(conn.sock)
+            self.reject(conn, e.status)
+            return
+        except OSError:
+            selector.unregister(conn.sock)
+            self.close_connection(conn)
+            return
+        if conn.request is not None:
+            selector.unregister(conn.sock)
+            executor.submit(self.handle_connection, conn)
+
+    def serve(self):
+        executor = ThreadPoolExecutor(max_workers=self.threads)
+        selector = selectors.DefaultSelector()
+        self.sock.setblocking(False)
+        selector.register(self.sock, selectors.EVENT_READ)
+        selector.register(self.wake_reader, selectors.EVENT_READ)
+        listening = True
+        deadline = None
+        if self.notify:
+            self.notify("ready")
+
+        try:
+            while True:
+                if self.stopping.is_set() and listening:
+                    # забираем уже пришедшие соединения и перестаём слушать порт;
+                    # открытые соединения получат ответ с connection: close
+                    self.accept_pending(selector)
+                    selector.unregister(self.sock)
+                    self.sock.close()
+                    listening = False
+                    deadline = time.monotonic() + self.graceful_timeout
+                if not listening and (
+                    not self.connections or time.monotonic() >= deadline
+                ):
+                    break
+
+                for key, _ in selector.select(timeout=0.5):
+                    if key.fileobj is self.sock:
+                        self.accept_pending(selector)
+                    elif key.fileobj is self.wake_reader:
+                        self.wake_reader.recv(4096)
+                        while not self.returned.empty():
+                            conn = self.returned.get()
+                            selector.register(conn.sock, selectors.EVENT_READ, conn)
+                    else:
+                        self.read_connection(selector, key.data, executor)
+
+                self.close_idle(selector, self.keepalive_timeout)
+        finally:
+            if listening:
+                self.sock.close()
+            for conn in list(self.connections):
+                self.close_connection(conn)
+            selector.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def handle_connection(self, conn: Connection):
+        try:
+            while conn.request is not None:
+                request, conn.request = conn.request, None
+                keep_alive = self.handle_request(conn.sock, request, conn.addr)
+                self.count_request()
+                if not keep_alive:
+                    self.close_connection(conn)
+                    return
+                # следующий запрос, если клиент прислал их конвейером
+                conn.request = parse_request(conn.buffer)
+        except RequestError as e:
+            self.reject(conn, e.status)
+            return
+        except Exception:
+            # ошибки приложения уже записаны в wsgi.errors в handle_request
+            self.close_connection(conn)
+            return
+
+        # соединение возвращается в селектор основного потока
+        conn.idle_since = time.monotonic()
+        self.returned.put(conn)
+        self.wake_writer.send(b"\0")
+
+    def make_environ(self, request, addr) -> dict:
+        method, target, version, headers, body = request
+        path, _, query = target.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, encoding="latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.server_name,
+            "SERVER_PORT": str(self.server_port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": addr[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": self.multiprocess,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers:
+            key = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[key] = value
+            elif f"HTTP_{key}" in environ:
+                environ[f"HTTP_{key}"] += "," + value
+            else:
+                environ[f"HTTP_{key}"] = value
+        return environ
+
+    def handle_request(self, conn: socket.socket, request, addr) -> bool:
+        method, version, headers = request[0], request[2], request[3]
+        keep_alive = version == "HTTP/1.1" and not wants_close(headers)
+        environ = self.make_environ(request, addr)
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (k.lower().encode("latin-1"), v.encode("latin-1"))
+                for k, v in response_headers
+            ]
+            return conn.sendall
+
+        head_sent = False
+        chunked = False
+        body = True
+        try:
+            result = self.app(environ, start_response)
+            try:
+                for chunk in result:
+                    if not head_sent:
+                        body = has_body(method, response["status"])
+                        keep_alive, chunked = self.send_head(
+                            conn, response, keep_alive, body
+                        )
+                        head_sent = True
+                    if chunk and body:
+                        conn.sendall(encode_chunk(chunk) if chunked else chunk)
+                if not head_sent:
+                    body = has_body(method, response["status"])
+                    keep_alive, chunked = self.send_head(
+                        conn, response, keep_alive, body
+                    )
+                    head_sent = True
+                if chunked:
+                    conn.sendall(b"0\r\n\r\n")
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except ConnectionError:
+            # клиент ушёл, отвечать некому
+            raise
+        except Exception:
+            traceback.print_exc(file=environ["wsgi.errors"])
+            if not head_sent:
+                conn.sendall(make_error_response(500))
+            # после частично отправленного ответа соединение только закрыть
+            return False
+        return keep_alive
+
+    def send_head(self, conn, response, keep_alive, body=True) -> tuple[bool, bool]:
+        headers = list(response["headers"])
+        chunked = False
+        if body and not any(name == b"content-length" for name, _ in headers):
+            # длина заранее неизвестна (потоковый ответ)
+            if keep_alive:
+                chunked = True
+                headers.append((b"transfer-encoding", b"chunked"))
+        if self.stopping.is_set():
+            keep_alive = False
+        if not keep_alive:
+            headers.append((b"connection", b"close"))
+        conn.sendall(make_head(response["status"], headers))
+        return keep_alive, chunked
+
+
+class Lifespan:
+    def __init__(self, app):
+        self.app = app
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.started = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.task = None
+
+    async def receive(self):
+        return await self.queue.get()
+
+    async def send(self, message):
+        if message["type"].startswith("lifespan.startup"):
+            self.started.set()
+        elif message["type"].startswith("lifespan.shutdown"):
+            self.stopped.set()
+
+    async def startup(self):
+        self.task = asyncio.ensure_future(
+            self.app({"type": "lifespan"}, self.receive, self.send)
+        )
+        await self.queue.put({"type": "lifespan.startup"})
+        await self.started.wait()
+
+    async def shutdown(self):
+        await self.queue.put({"type": "lifespan.shutdown"})
+        await self.stopped.wait()
+        await self.task
+
+
+class ASGIWorker:
+    """Асинхронный HTTP/1.1 keep-alive фронт для ASGI-приложения."""
+
+    def __init__(
+        self,
+        app,
+        sock: socket.socket,
+        max_requests: int = 0,
+        keepalive_timeout: float = SERVER_KEEPALIVE_TIMEOUT,
+        graceful_timeout: float = SERVER_GRACEFUL_TIMEOUT,
+        notify=None,
+    ):
+        self.app = app
+        self.sock = sock
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.notify = notify
+        self.handled = 0
+        self.connections: set[asyncio.Task] = set()
+        self.stopping: asyncio.Event | None = None
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        server = writer.get_extra_info("sockname")[:2]
+        client = writer.get_extra_info("peername")[:2]
+        try:
+            # после остановки соединение закрывается ответом с connection: close
+            while True:
+                request = await asyncio.wait_for(
+                    read_request(reader), self.keepalive_timeout
+                )
+                if request is None:
+                    break
+                keep_alive = await self.handle_request(request, writer, server, client)
+                self.handled += 1
+                if self.max_requests and self.handled == self.max_requests:
+                    retire(self)
+                if not keep_alive:
+                    break
+        except RequestError as e:
+            writer.write(make_error_response(e.status))
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            asyncio.TimeoutError,
+            asyncio.CancelledError,
+        ):
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def handle_request(self, request, writer, server, client) -> bool:
+        method, target, version, headers, body = request
+        path, _, query = target.partition("?")
+        keep_alive = version == "HTTP/1.1" and not wants_close(headers)
+        head_sent = False
+        chunked = False
+        response_body = True
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": version.removeprefix("HTTP/"),
+            "method": method,
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "headers": headers,
+            "server": server,
+            "client": client,
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal head_sent, chunked, keep_alive, response_body
+            if message["type"] == "http.response.start":
+                head_sent = True
+                response_headers = list(message.get("headers", []))
+                response_body = has_body(method, message["status"])
+                if response_body and not any(
+                    name == b"content-length" for name, _ in response_headers
+                ):
+                    # длина заранее неизвестна (потоковый ответ)
+                    if keep_alive:
+                        chunked = True
+                        response_headers.append((b"transfer-encoding", b"chunked"))
+                if self.stopping.is_set():
+                    keep_alive = False
+                if not keep_alive:
+                    response_headers.append((b"connection", b"close"))
+                writer.write(make_head(message["status"], response_headers))
+            elif message["type"] == "http.response.body" and response_body:
+                chunk = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if chunked:
+                    if chunk:
+                        writer.write(encode_chunk(chunk))
+                    if not more_body:
+                        writer.write(b"0\r\n\r\n")
+                elif chunk:
+                    writer.write(chunk)
+                await writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except ConnectionError:
+            # клиент ушёл, отвечать некому
+            raise
+        except Exception:
+            traceback.print_exc()
+            if not head_sent:
+                writer.write(make_error_response(500))
+                await writer.drain()
+            # после частично отправленного ответа соединение только закрыть
+            return False
+        return keep_alive
+
+    async def serve(self, install_signals: bool = False):
+        self.stopping = asyncio.Event()
+        if install_signals:
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self.stop)
+
+        lifespan = Lifespan(self.app)
+        await lifespan.startup()
+        server = await asyncio.start_server(
+            self.handle_connection, sock=self.sock, backlog=SERVER_BACKLOG
+        )
+        if self.notify:
+            self.notify("ready")
+        try:
+            await self.stopping.wait()
+        finally:
+            # новые соединения не принимаем, открытые дорабатывают свой запрос
+            server.close()
+            deadline = time.monotonic() + self.graceful_timeout
+            while self.connections and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            for task in list(self.connections):
+                task.cancel()
+            await server.wait_closed()
+            await lifespan.shutdown()
+
+
+def serve_wsgi(app, host: str = "127.0.0.1", port: int = 8000, **options):
+    WSGIWorker(app, make_listen_socket(host, port), **options).serve()
+
+
+def serve_asgi(app, host: str = "127.0.0.1", port: int = 8000, **options):
+    worker = ASGIWorker(app, make_listen_socket(host, port), **options)
+    try:
+        asyncio.run(worker.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def load_app(app_path: str):
+    module_name, _, attr = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "app")
+
+
+def detect_interface(app) -> str:
+    call = app if inspect.isfunction(app) else getattr(app, "__call__", app)
+    return "asgi" if inspect.iscoroutinefunction(call) else "wsgi"
+
+
+def run_worker(config: dict, max_requests: int, events):
+    def notify(event: str):
+        events.put((event, os.getpid()))
+
+    app = load_app(config["app"])
+    interface = config["interface"] or detect_interface(app)
+    sock = make_listen_socket(config["host"], config["port"], reuse_port=True)
+
+    if interface == "asgi":
+        worker = ASGIWorker(
+            app,
+            sock,
+            max_requests=max_requests,
+            keepalive_timeout=config["keepalive_timeout"],
+            graceful_timeout=config["graceful_timeout"],
+            notify=notify,
+        )
+        asyncio.run(worker.serve(install_signals=True))
+    else:
+        worker = WSGIWorker(
+            app,
+            sock,
+            threads=config["threads"],
+            max_requests=max_requests,
+            keepalive_timeout=config["keepalive_timeout"],
+            graceful_timeout=config["graceful_timeout"],
+            multiprocess=config["workers"] > 1,
+            notify=notify,
+        )
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.serve()
+
+
+class Master:
+    """Держит N воркеров: заменяет упавших и отработавших свой лимит
+    запросов, по SIGHUP плавно заменяет всех на свежие процессы.
+
+    Старый воркер получает SIGTERM только после того, как его замена
+    сообщила о готовности, поэтому порт не остаётся без слушателя.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        # spawn, а не fork: после reload воркеры заново импортируют код приложения
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.workers: dict[int, multiprocessing.Process] = {}
+        # pid новой замены -> воркер, которого она сменяет
+        self.replacing: dict[int, multiprocessing.Process] = {}
+        self.retiring: list[multiprocessing.Process] = []
+        self.reload_requested = False
+        self.shutdown_requested = False
+
+    def spawn_worker(self) -> int:
+        max_requests = self.config["max_requests"]
+        if max_requests:
+            # разброс, чтобы воркеры не перезапускались одновременно
+            max_requests += random.randint(0, self.config["max_requests_jitter"])
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.config, max_requests, self.events),
+            daemon=False,
+        )
+        process.start()
+        self.workers[process.pid] = process
+        return process.pid
+
+    def replace_worker(self, pid: int):
+        process = self.workers.pop(pid, None)
+        if process is not None:
+            self.replacing[self.spawn_worker()] = process
+
+    def retire_worker(self, process: multiprocessing.Process):
+        process.terminate()
+        self.retiring.append(process)
+
+    def request_reload(self, *_):
+        self.reload_requested = True
+
+    def request_shutdown(self, *_):
+        self.shutdown_requested = True
+
+    def reload(self):
+        self.reload_requested = False
+        for pid in list(self.workers):
+            if pid not in self.replacing:
+                self.replace_worker(pid)
+
+    def handle_events(self):
+        while True:
+            try:
+                event, pid = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if event == "retire":
+                self.replace_worker(pid)
+            elif event == "ready" and pid in self.replacing:
+                self.retire_worker(self.replacing.pop(pid))
+
+    def reap(self):
+        for pid, process in list(self.workers.items()):
+            if not process.is_alive():
+                process.join()
+                del self.workers[pid]
+                replaced = self.replacing.pop(pid, None)
+                if self.shutdown_requested:
+                    continue
+                new_pid = self.spawn_worker()
+                if replaced is not None:
+                    self.replacing[new_pid] = replaced
+        for process in list(self.retiring):
+            if not process.is_alive():
+                process.join()
+                self.retiring.remove(process)
+
+    def shutdown(self):
+        processes = (
+            list(self.workers.values()) + list(self.replacing.values()) + self.retiring
+        )
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + self.config["graceful_timeout"] + 1
+        for process in processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self.request_reload)
+        signal.signal(signal.SIGTERM, self.request_shutdown)
+        signal.signal(signal.SIGINT, self.request_shutdown)
+
+        for _ in range(self.config["workers"]):
+            self.spawn_worker()
+        print(
+            f"Serving {self.config['app']} on "
+            f"http://{self.config['host']}:{self.config['port']} "
+            f"with {self.config['workers']} workers (pid {os.getpid()})",
+            flush=True,
+        )
+
+        try:
+            while not self.shutdown_requested:
+                if self.reload_requested:
+                    self.reload()
+                self.handle_events()
+                self.reap()
+                time.sleep(0.1)
+        finally:
+            self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Многопроцессный сервер для WSGI/ASGI приложений"
+    )
+    parser.add_argument(
+        "app", help="module:callable, например src.task_6_asgi:asgi_app"
+    )
+    parser.add_argument("--interface", choices=["asgi", "wsgi"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    parser.add_argument("--max-requests", type=int, default=0)
+    parser.add_argument("--max-requests-jitter", type=int, default=0)
+    parser.add_argument(
+        "--keepalive-timeout", type=float, default=SERVER_KEEPALIVE_TIMEOUT
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=float, default=SERVER_GRACEFUL_TIMEOUT
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("SO_REUSEPORT is not supported on this platform, use --workers 1")
+
+    Master(vars(args)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import asyncio
+import itertools
+import json
+import random
+import string
+import threading
+
+from aiohttp import web
+
+COMMON_CODES = ["USD", "EUR", "GBP", "JPY", "CNY", "CHF", "RUB", "KZT", "TRY", "INR"]
+
+
+def make_codes(count: int) -> list[str]:
+    codes = COMMON_CODES[:count]
+    for letters in itertools.product(string.ascii_uppercase, repeat=3):
+        if len(codes) >= count:
+            break
+        code = "".join(letters)
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+def make_base_rates(codes: list[str], seed: int = 42) -> dict[str, float]:
+    rnd = random.Random(seed)
+    return {
+        code: 1 if code == "USD" else round(rnd.uniform(0.01, 500), 4) for code in codes
+    }
+
+
+class StubProvider:
+    """Локальная заглушка провайдера курсов: GET /v4/latest/{code}.
+
+    latency - задержка ответа в секундах, error_rate - доля ответов 500,
+    codes - число валют в таблице (определяет размер ответа).
+    """
+
+    def __init__(
+        self, latency: float = 0.05, error_rate: float = 0.0, codes: int = 160
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.codes = make_codes(codes)
+        self.base_rates = make_base_rates(self.codes)
+        self.requests = 0
+        self.errors = 0
+        self.random = random.Random(0)
+        self.url = ""
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.runner: web.AppRunner | None = None
+        self.thread: threading.Thread | None = None
+
+    def table_bytes(self, code: str) -> bytes:
+        base_rate = self.base_rates[code]
+        table = {
+            "provider": "stub",
+            "base": code,
+            "date": "2026-01-01",
+            "time_last_updated": 1767225600,
+            "rates": {
+                other: round(rate / base_rate, 6)
+                for other, rate in self.base_rates.items()
+            },
+        }
+        return json.dumps(table, separators=(",", ":")).encode()
+
+    async def handle_latest(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            body = json.dumps({"result": "error", "error-type": "internal-error"})
+            return web.Response(status=500, text=body, content_type="application/json")
+
+        code = request.match_info["code"]
+        if code not in self.base_rates:
+            body = json.dumps({"result": "error", "error-type": "unsupported-code"})
+            return web.Response(status=404, text=body, content_type="application/json")
+        return web.Response(
+            body=self.table_bytes(code), content_type="application/json"
+        )
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/v4/latest/{code}", self.handle_latest)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0, backlog=4096)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def start_in_thread(self) -> str:
+        # заглушка крутится в своём цикле событий, чтобы не отнимать время
+        # у измеряемого приложения
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.stop())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.url
+
+    def stop_thread(self):
+        if self.loop is not None and self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
@@ -1,5 +1,53 @@
 import json
+import time
+import urllib.error
+import urllib.request
+
+from src.asgi_wsgi_constants import PROVIDER, TIMEOUT
+
+READ_CHUNK = 64 * 1024
 
 
 def make_error_message_body(message: str) -> bytes:
     return json.dumps({"error": f"{message}"}, ensure_ascii=False).encode()
+
+
+def read_before(resp, deadline: float) -> bytes:
+    # таймаут сокета ограничивает одну операцию, а не весь ответ: провайдер,
+    # присылающий байты по одному, растянул бы чтение сколько угодно
+    chunks = []
+    while chunk := resp.read1(READ_CHUNK):
+        chunks.append(chunk)
+        if time.monotonic() > deadline:
+            raise TimeoutError("Upstream response exceeded the time budget")
+    return b"".join(chunks)
+
+
+def fetch_upstream_bytes(code: str, timeout: float = TIMEOUT) -> tuple[int, bytes]:
+    """GET курсов у провайдера; timeout - бюджет на весь запрос.
+
+    Бюджет проверяется между чтениями, поэтому одна зависшая операция
+    сокета может превысить его не больше чем на сам timeout.
+    """
+    deadline = time.monotonic() + timeout
+    url = f"{PROVIDER}/v4/latest/{code}"
+    req = urllib.request.Request(url)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.getcode(), read_before(resp, deadline)
+    except urllib.error.HTTPError as e:
+        body = e.read() or json.dumps({"error": f"Upstream HTTP {e.code}"}).encode()
+        return e.code, body
+
+
+def make_batch_entry(code: str, status: int, body: bytes, symbols: list[str]) -> bytes:
+    key = json.dumps(code).encode()
+    if status != 200:
+        return key + b":" + make_error_message_body(f"Upstream HTTP {status}")
+    if not symbols:
+        return key + b":" + body
+
+    table = json.loads(body)
+    rates = table.get("rates", {})
+    table["rates"] = {symbol: rates[symbol] for symbol in symbols if symbol in rates}
+    return key + b":" + json.dumps(table, separators=(",", ":")).encode()
@@ -1,5 +1,25 @@
 import re
+from urllib.parse import parse_qs
+
+from src.asgi_wsgi_constants import MAX_BATCH_BASES
 
 
 def validate_currency_code(code: str) -> bool:
     return bool(re.fullmatch(r"[A-Z]{3}", code or ""))
+
+
+def parse_code_list(value: str) -> list[str] | None:
+    codes = list(dict.fromkeys(c.strip().upper() for c in value.split(",") if c))
+    if not all(validate_currency_code(code) for code in codes):
+        return None
+    return codes
+
+
+def parse_batch_query(query_string: str) -> tuple[list[str], list[str]] | None:
+    query = parse_qs(query_string)
+    bases = parse_code_list(",".join(query.get("bases", [])))
+    symbols = parse_code_list(",".join(query.get("symbols", [])))
+
+    if not bases or len(bases) > MAX_BATCH_BASES or symbols is None:
+        return None
+    return bases, symbols
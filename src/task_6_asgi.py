@@ -1,12 +1,24 @@
 import asyncio
 import json
-import urllib.error
-import urllib.request
 from typing import List, Optional, Tuple
 
-from src.asgi_wsgi_constants import ERROR_MESSAGES, PROVIDER, TIMEOUT
-from src.asgi_wsgi_utils import make_error_message_body
-from src.asgi_wsgi_validators import validate_currency_code
+import aiohttp
+
+from src.asgi_wsgi_breaker import CircuitBreaker, CircuitOpenError, upstream_breaker
+from src.asgi_wsgi_constants import (
+    BATCH_PATH,
+    CROSS_RATES_MODE,
+    ERROR_MESSAGES,
+    HEALTH_PATH,
+    PROVIDER,
+    UPSTREAM_BUDGET,
+    UPSTREAM_CONCURRENCY,
+    UPSTREAM_KEEPALIVE,
+)
+from src.asgi_wsgi_rates import UpstreamHTTPError, cross_rate_cache
+from src.asgi_wsgi_responses import prepared_bodies
+from src.asgi_wsgi_utils import make_batch_entry, make_error_message_body
+from src.asgi_wsgi_validators import parse_batch_query, validate_currency_code
 
 
 async def send_json_response(
@@ -34,18 +46,209 @@ async def send_json_response(
     await send({"type": "http.response.body", "body": body})
 
 
-def fetch_upstream_bytes(code: str) -> tuple[int, bytes]:
-    url = f"{PROVIDER}/v4/latest/{code}"
-    req = urllib.request.Request(url)
+def get_header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+async def send_prepared_response(scope, send, code: str, data: bytes):
+    entry = prepared_bodies.prepare(code, data)
+    use_gzip = entry.use_gzip(get_header(scope, b"accept-encoding"))
+
+    if entry.matches(get_header(scope, b"if-none-match")):
+        await send_json_response(
+            send=send,
+            status=304,
+            body=b"",
+            headers_in=entry.asgi_not_modified_headers[use_gzip],
+        )
+        return
+
+    await send_json_response(
+        send=send,
+        status=200,
+        body=entry.payload(use_gzip),
+        headers_in=entry.asgi_headers[use_gzip],
+    )
+
+
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError)
+
+
+class UpstreamClient:
+    def __init__(
+        self,
+        provider: str = PROVIDER,
+        max_concurrency: int = UPSTREAM_CONCURRENCY,
+        timeout: float = UPSTREAM_BUDGET,
+        breaker: CircuitBreaker = upstream_breaker,
+    ):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.breaker = breaker
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.inflight: dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed:
+            if self.loop is loop:
+                return
+            # сессия осталась от другого (уже закрытого) цикла событий
+            self.inflight.clear()
+
+        self.loop = loop
+
+        # limit у коннектора ограничивает число одновременных запросов к провайдеру,
+        # остальные ждут свободное keep-alive соединение
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.max_concurrency,
+            keepalive_timeout=UPSTREAM_KEEPALIVE,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Accept": "application/json"},
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def run_once(self, key: str, factory):
+        # одновременные запросы с одним ключом ждут один и тот же вызов
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.inflight[key] = future
+            future.add_done_callback(lambda f: self.forget(key, f))
+        return await asyncio.shield(future)
+
+    def forget(self, key: str, future: asyncio.Future):
+        self.inflight.pop(key, None)
+        # все ожидающие могли уйти по таймауту - забираем исключение сами
+        if not future.cancelled():
+            future.exception()
+
+    async def fetch(self, code: str) -> tuple[int, bytes]:
+        # бюджет времени у каждого запроса свой, общий вызов при этом не отменяется
+        return await asyncio.wait_for(
+            self.run_once(code, lambda: self._fetch(code)), self.timeout
+        )
+
+    async def _fetch(self, code: str) -> tuple[int, bytes]:
+        return await self.breaker.call_async(lambda: self._request(code))
+
+    async def _request(self, code: str) -> tuple[int, bytes]:
+        await self.start()
+        url = f"{self.provider}/v4/latest/{code}"
+        async with self.session.get(url) as resp:
+            body = await resp.read()
+            if resp.status != 200 and not body:
+                body = json.dumps({"error": f"Upstream HTTP {resp.status}"}).encode()
+            return resp.status, body
+
+
+upstream_client = UpstreamClient()
+
+
+async def refresh_cross_rates():
+    status, body = await upstream_client.fetch(cross_rate_cache.base)
+    await asyncio.to_thread(cross_rate_cache.apply_refresh, status, body)
+
+
+async def fetch_cross_rates(code: str) -> tuple[int, bytes]:
+    if cross_rate_cache.is_stale():
+        try:
+            await upstream_client.run_once("cross-rates", refresh_cross_rates)
+        except UpstreamHTTPError as e:
+            return e.status, e.body
+        except UPSTREAM_ERRORS:
+            # пока провайдер недоступен, отдаём последние известные курсы
+            if not cross_rate_cache.tables:
+                raise
+            cross_rate_cache.postpone()
+
+    data = cross_rate_cache.get(code)
+    if data is None:
+        return 404, make_error_message_body(ERROR_MESSAGES["unsupported_code"])
+    return 200, data
+
+
+async def fetch_rates(code: str) -> tuple[int, bytes]:
+    if CROSS_RATES_MODE:
+        return await fetch_cross_rates(code)
+    return await upstream_client.fetch(code)
+
+
+async def fetch_batch_entry(code: str, symbols: list[str]) -> bytes:
     try:
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-            return resp.getcode(), resp.read()
-    except urllib.error.HTTPError as e:
-        body = e.read() or json.dumps({"error": f"Upstream HTTP {e.code}"}).encode()
-        return e.code, body
+        status, body = await fetch_rates(code)
+    except UPSTREAM_ERRORS:
+        status, body = 502, make_error_message_body(ERROR_MESSAGES["bad_gateway"])
+    return make_batch_entry(code, status, body, symbols)
+
+
+async def send_batch_response(send, query_string: bytes):
+    query = parse_batch_query(query_string.decode("latin-1"))
+    if query is None:
+        body = make_error_message_body(ERROR_MESSAGES["invalid_batch_query"])
+        await send_json_response(send=send, status=400, body=body)
+        return
+
+    bases, symbols = query
+    tasks = [asyncio.ensure_future(fetch_batch_entry(code, symbols)) for code in bases]
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"cache-control", b"no-store"),
+                ],
+            }
+        )
+        # открывающая скобка уходит клиенту сразу, таблицы - по мере готовности
+        await send({"type": "http.response.body", "body": b"{", "more_body": True})
+        for i, task in enumerate(asyncio.as_completed(tasks)):
+            entry = await task
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": (b"," if i else b"") + entry,
+                    "more_body": True,
+                }
+            )
+        await send({"type": "http.response.body", "body": b"}"})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await upstream_client.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await upstream_client.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
 
 
 async def asgi_app(scope, receive, send):
+    if scope.get("type") == "lifespan":
+        await handle_lifespan(receive, send)
+        return
+
     if scope.get("type") != "http":
         body = make_error_message_body(ERROR_MESSAGES["unsupported_scope_type"])
         await send_json_response(
@@ -67,6 +270,20 @@ async def asgi_app(scope, receive, send):
         )
         return
 
+    if path.rstrip("/") == BATCH_PATH:
+        await send_batch_response(send, scope.get("query_string", b""))
+        return
+
+    if path.rstrip("/") == HEALTH_PATH:
+        body = json.dumps({"upstream_breaker": upstream_breaker.snapshot()}).encode()
+        await send_json_response(
+            send=send,
+            status=200,
+            body=body,
+            extra_headers=[(b"cache-control", b"no-store")],
+        )
+        return
+
     code = path.strip("/").upper()
     if not validate_currency_code(code):
         body = make_error_message_body(ERROR_MESSAGES["invalid_path"])
@@ -74,21 +291,35 @@ async def asgi_app(scope, receive, send):
         return
 
     try:
-        status, data = await asyncio.to_thread(fetch_upstream_bytes, code)
-        extra_headers = [
-            (b"cache-control", b"no-store"),
-        ]
+        status, data = await fetch_rates(code)
+    except CircuitOpenError:
+        status = 503
+        data = make_error_message_body(ERROR_MESSAGES["upstream_unavailable"])
+    except UPSTREAM_ERRORS:
+        status = 502
+        data = make_error_message_body(ERROR_MESSAGES["bad_gateway"])
 
-        await send_json_response(
-            send=send, status=status, body=data, extra_headers=extra_headers
-        )
+    if status == 200:
+        await send_prepared_response(scope, send, code, data)
+        return
 
-    except urllib.error.URLError:
-        body = make_error_message_body(ERROR_MESSAGES["bad_gateway"])
-        await send_json_response(send=send, status=502, body=body)
+    stale = prepared_bodies.get(code)
+    if status >= 500 and stale is not None:
+        # провайдер недоступен - отдаём последнюю успешную таблицу
+        await send_prepared_response(scope, send, code, stale.body)
+        return
+
+    extra_headers = [
+        (b"cache-control", b"no-store"),
+    ]
+    await send_json_response(
+        send=send, status=status, body=data, extra_headers=extra_headers
+    )
 
 
-async def run_asgi_app(app, method="GET", path="/USD"):
+async def run_asgi_app(
+    app, method="GET", path="/USD", query_string="", request_headers=None
+):
     status = None
     headers = []
     body_chunks = []
@@ -110,8 +341,8 @@ async def run_asgi_app(app, method="GET", path="/USD"):
         "method": method,
         "path": path,
         "raw_path": path.encode(),
-        "query_string": b"",
-        "headers": [],
+        "query_string": query_string.encode(),
+        "headers": request_headers or [],
         "scheme": "http",
         "server": ("localhost", 8000),
         "client": ("127.0.0.1", 12345),
@@ -128,6 +359,14 @@ async def run_asgi_app(app, method="GET", path="/USD"):
     return response_lines
 
 
+async def main():
+    await upstream_client.start()
+    try:
+        return await run_asgi_app(asgi_app, path="/USD")
+    finally:
+        await upstream_client.close()
+
+
 if __name__ == "__main__":
-    resp = asyncio.run(run_asgi_app(asgi_app, path="/USD"))
+    resp = asyncio.run(main())
     print(b"\r\n".join(resp).decode())
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from src import asgi_wsgi_utils
+from src.asgi_wsgi_stub import StubProvider
+from src.task_6_asgi import UpstreamClient
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def thread_pool_fetch(code: str) -> tuple[int, bytes]:
+    return await asyncio.to_thread(asgi_wsgi_utils.fetch_upstream_bytes, code)
+
+
+async def run_clients(fetch, codes: list[str], clients: int, requests_per_client: int):
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                status, _ = await fetch(random.choice(codes))
+            except Exception:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def benchmark(
+    clients: int = 1000,
+    requests_per_client: int = 5,
+    latency: float = 0.05,
+    distinct_codes: int = 20,
+):
+    stub = StubProvider(latency=latency)
+    url = stub.start_in_thread()
+    asgi_wsgi_utils.PROVIDER = url
+    codes = stub.codes[:distinct_codes]
+
+    results = {}
+    try:
+        stub.requests = 0
+        results["thread_pool_urllib"] = await run_clients(
+            thread_pool_fetch, codes, clients, requests_per_client
+        )
+        results["thread_pool_urllib"]["upstream_calls"] = stub.requests
+
+        client = UpstreamClient(provider=url)
+        await client.start()
+        try:
+            stub.requests = 0
+            results["pooled_aiohttp"] = await run_clients(
+                client.fetch, codes, clients, requests_per_client
+            )
+            results["pooled_aiohttp"]["upstream_calls"] = stub.requests
+        finally:
+            await client.close()
+    finally:
+        stub.stop_thread()
+
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(benchmark()), indent=2))
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from src import asgi_wsgi_breaker, asgi_wsgi_utils, task_6_asgi, task_6_wsgi
+from src.asgi_wsgi_breaker import upstream_breaker
+from src.asgi_wsgi_responses import prepared_bodies
+from src.asgi_wsgi_stub import StubProvider
+
+BUDGET = 0.3
+
+
+def configure(url: str):
+    asgi_wsgi_utils.PROVIDER = url
+    asgi_wsgi_breaker.UPSTREAM_BUDGET = BUDGET
+    task_6_asgi.upstream_client.provider = url
+    task_6_asgi.upstream_client.timeout = BUDGET
+    upstream_breaker.min_calls = 5
+    upstream_breaker.slow_call_seconds = BUDGET
+    upstream_breaker.open_seconds = 1
+
+
+def reset():
+    upstream_breaker.reset()
+    prepared_bodies.entries.clear()
+
+
+def wsgi_get(path: str) -> tuple[int, float]:
+    start = time.perf_counter()
+    status = task_6_wsgi.run_wsgi_app(
+        task_6_wsgi.simple_app, {"REQUEST_METHOD": "GET", "PATH_INFO": path}
+    )[0]
+    return int(status.split()[1]), time.perf_counter() - start
+
+
+async def asgi_get(path: str) -> tuple[int, float]:
+    start = time.perf_counter()
+    status = (await task_6_asgi.run_asgi_app(task_6_asgi.asgi_app, path=path))[0]
+    return int(status.split()[1]), time.perf_counter() - start
+
+
+async def check(stub: StubProvider, get):
+    reset()
+    stub.latency = 0
+    assert (await get("/EUR"))[0] == 200
+
+    # провайдер тормозит дольше бюджета: отдаём кеш, копим неудачи
+    stub.latency = 1.0
+    for _ in range(upstream_breaker.min_calls):
+        status, elapsed = await get("/EUR")
+        assert status == 200 and elapsed < BUDGET + 0.2, (status, elapsed)
+    assert upstream_breaker.snapshot()["state"] == "open"
+
+    # предохранитель разомкнут: ответ за миллисекунды, без обращения к провайдеру
+    calls = stub.requests
+    status, elapsed = await get("/EUR")
+    assert status == 200 and elapsed < 0.05, (status, elapsed)
+    status, elapsed = await get("/GBP")
+    assert status == 503 and elapsed < 0.05, (status, elapsed)
+    assert stub.requests == calls
+
+    # провайдер восстановился: пробные запросы замыкают цепь
+    stub.latency = 0
+    await asyncio.sleep(upstream_breaker.open_seconds)
+    for _ in range(upstream_breaker.half_open_probes):
+        assert (await get("/GBP"))[0] == 200
+    assert upstream_breaker.snapshot()["state"] == "closed"
+
+    print(upstream_breaker.snapshot())
+
+
+async def main():
+    stub = StubProvider(latency=0)
+    configure(stub.start_in_thread())
+    try:
+        await check(stub, lambda path: asyncio.to_thread(wsgi_get, path))
+        await check(stub, asgi_get)
+    finally:
+        await task_6_asgi.upstream_client.close()
+        stub.stop_thread()
+    print("Circuit breaker checks passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+from src import asgi_wsgi_utils, task_6_asgi, task_6_wsgi
+from src.asgi_wsgi_stub import StubProvider
+
+
+def make_scenarios(etag: str) -> dict[str, dict]:
+    return {
+        "full_body": {},
+        "gzip": {"Accept-Encoding": "gzip, deflate"},
+        "if_none_match": {"If-None-Match": etag},
+    }
+
+
+def run_wsgi_scenario(headers: dict, requests: int) -> tuple[float, int]:
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/EUR"}
+    environ.update(
+        {f"HTTP_{k.upper().replace('-', '_')}": v for k, v in headers.items()}
+    )
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        resp = task_6_wsgi.run_wsgi_app(task_6_wsgi.simple_app, environ)
+        total_bytes += sum(len(line) + 2 for line in resp)
+    return time.perf_counter() - start, total_bytes
+
+
+async def run_asgi_scenario(headers: dict, requests: int) -> tuple[float, int]:
+    request_headers = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        resp = await task_6_asgi.run_asgi_app(
+            task_6_asgi.asgi_app, path="/EUR", request_headers=request_headers
+        )
+        total_bytes += sum(len(line) + 2 for line in resp)
+    return time.perf_counter() - start, total_bytes
+
+
+def etag_of(resp: list[bytes]) -> str:
+    for line in resp:
+        if line.lower().startswith(b"etag: "):
+            return line[6:].decode()
+    return ""
+
+
+def benchmark(requests: int = 5000) -> dict:
+    stub = StubProvider(latency=0)
+    url = stub.start_in_thread()
+    asgi_wsgi_utils.PROVIDER = url
+    task_6_asgi.upstream_client.provider = url
+    # в режиме кросс-курсов провайдер опрашивается один раз,
+    # и замер показывает только стоимость формирования ответа
+    task_6_wsgi.CROSS_RATES_MODE = True
+    task_6_asgi.CROSS_RATES_MODE = True
+
+    first = task_6_wsgi.run_wsgi_app(
+        task_6_wsgi.simple_app, {"REQUEST_METHOD": "GET", "PATH_INFO": "/EUR"}
+    )
+    scenarios = make_scenarios(etag_of(first))
+
+    async def run_asgi_all():
+        await task_6_asgi.upstream_client.start()
+        try:
+            return {
+                name: await run_asgi_scenario(headers, requests)
+                for name, headers in scenarios.items()
+            }
+        finally:
+            await task_6_asgi.upstream_client.close()
+
+    results = {}
+    try:
+        for name, headers in scenarios.items():
+            elapsed, total_bytes = run_wsgi_scenario(headers, requests)
+            results[f"wsgi_{name}"] = (elapsed, total_bytes)
+        for name, (elapsed, total_bytes) in asyncio.run(run_asgi_all()).items():
+            results[f"asgi_{name}"] = (elapsed, total_bytes)
+    finally:
+        stub.stop_thread()
+
+    return {
+        name: {
+            "req_per_sec": round(requests / elapsed, 1),
+            "bytes_per_request": total_bytes // requests,
+        }
+        for name, (elapsed, total_bytes) in results.items()
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import socket
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from src import asgi_wsgi_utils, task_6_asgi, task_6_wsgi
+from src.asgi_wsgi_server import serve_asgi, serve_wsgi
+from src.asgi_wsgi_stub import StubProvider
+
+TARGETS = ["wsgi", "asgi", "wsgi-socket", "asgi-socket"]
+
+
+def set_provider_url(url: str):
+    asgi_wsgi_utils.PROVIDER = url
+    task_6_wsgi.PROVIDER = url
+    task_6_asgi.upstream_client.provider = url
+
+
+def use_provider(url: str, cross_rates: bool):
+    set_provider_url(url)
+    task_6_wsgi.CROSS_RATES_MODE = cross_rates
+    task_6_asgi.CROSS_RATES_MODE = cross_rates
+
+
+def make_paths(codes: list[str], requests: int, batch_ratio: float) -> list[str]:
+    rnd = random.Random(1)
+    paths = []
+    for _ in range(requests):
+        if rnd.random() < batch_ratio:
+            bases = ",".join(rnd.sample(codes, 5))
+            paths.append(f"/rates?bases={bases}&symbols=USD,EUR")
+        else:
+            paths.append(f"/{rnd.choice(codes)}")
+    return paths
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize(latencies: list[float], statuses: list[int], elapsed: float) -> dict:
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        "requests": len(latencies),
+        "elapsed_sec": round(elapsed, 3),
+        "req_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 2),
+            "p90": round(percentile(latencies, 90) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "statuses": counts,
+    }
+
+
+def wsgi_request(path: str) -> int:
+    path_info, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path_info,
+        "QUERY_STRING": query,
+        "HTTP_ACCEPT_ENCODING": "gzip",
+    }
+    status = ""
+
+    def start_response(status_line, headers):
+        nonlocal status
+        status = status_line
+
+    for _ in task_6_wsgi.simple_app(environ, start_response):
+        pass
+    return int(status.split(" ", 1)[0])
+
+
+async def asgi_request(path: str) -> int:
+    path_only, _, query = path.partition("?")
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path_only,
+        "query_string": query.encode(),
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    await task_6_asgi.asgi_app(scope, receive, send)
+    return status
+
+
+def measure_allocations(run_one, paths: list[str], provider_url: str) -> dict:
+    # пиковая память на один запрос и блоки, оставшиеся после прогона;
+    # tracemalloc видит весь процесс, поэтому на время замера приложение
+    # ходит в заглушку из отдельного процесса, а не в ту, что в нашем потоке
+    previous_url = asgi_wsgi_utils.PROVIDER
+    set_provider_url(provider_url)
+    tracemalloc.start()
+    try:
+        peaks = []
+        blocks_before = len(tracemalloc.take_snapshot().traces)
+        for path in paths:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run_one(path)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        blocks_after = len(tracemalloc.take_snapshot().traces)
+    finally:
+        tracemalloc.stop()
+        set_provider_url(previous_url)
+
+    return {
+        "peak_bytes_per_request": round(statistics.mean(peaks)),
+        "retained_blocks_per_request": round(
+            (blocks_after - blocks_before) / len(paths), 3
+        ),
+    }
+
+
+def run_wsgi(
+    paths: list[str], concurrency: int, alloc_requests: int, alloc_url: str
+) -> dict:
+    wsgi_request(paths[0])  # прогрев кешей
+
+    def timed(path):
+        start = time.perf_counter()
+        status = wsgi_request(path)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, paths))
+    elapsed = time.perf_counter() - start
+
+    report = summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+    report["allocations"] = measure_allocations(
+        wsgi_request, paths[:alloc_requests], alloc_url
+    )
+    return report
+
+
+async def run_asgi_async(
+    paths: list[str], concurrency: int, alloc_requests: int, alloc_url: str
+):
+    await task_6_asgi.upstream_client.start()
+    try:
+        await asgi_request(paths[0])
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], []
+
+        async def timed(path):
+            async with semaphore:
+                start = time.perf_counter()
+                statuses.append(await asgi_request(path))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(path) for path in paths))
+        report = summarize(latencies, statuses, time.perf_counter() - start)
+
+        # замер аллокаций синхронно прогоняет цикл событий по одному запросу
+        loop = asyncio.get_running_loop()
+        allocations = await loop.run_in_executor(
+            None,
+            lambda: measure_allocations(
+                lambda p: asyncio.run_coroutine_threadsafe(
+                    asgi_request(p), loop
+                ).result(),
+                paths[:alloc_requests],
+                alloc_url,
+            ),
+        )
+        report["allocations"] = allocations
+        return report
+    finally:
+        await task_6_asgi.upstream_client.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_server(target: str, port: int, url: str, cross_rates: bool):
+    use_provider(url, cross_rates)
+    if target == "wsgi-socket":
+        serve_wsgi(task_6_wsgi.simple_app, port=port)
+    else:
+        serve_asgi(task_6_asgi.asgi_app, port=port)
+
+
+async def run_socket_async(base_url: str, paths: list[str], concurrency: int) -> dict:
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    latencies, statuses = [], []
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+        async def timed(path):
+            start = time.perf_counter()
+            try:
+                async with session.get(base_url + path) as resp:
+                    await resp.read()
+                    statuses.append(resp.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                statuses.append(0)
+            latencies.append(time.perf_counter() - start)
+
+        await timed(paths[0])
+        latencies.clear()
+        statuses.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(path) for path in paths))
+        return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Server on port {port} did not start")
+
+
+def serve_stub(latency: float, error_rate: float, codes: int, conn):
+    stub = StubProvider(latency=latency, error_rate=error_rate, codes=codes)
+    conn.send(stub.start_in_thread())
+    stub.thread.join()
+
+
+def start_stub_process(latency: float, error_rate: float, codes: int):
+    """Заглушка в отдельном процессе: её аллокации не попадают в tracemalloc."""
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve_stub, args=(latency, error_rate, codes, child_conn), daemon=True
+    )
+    process.start()
+    return process, parent_conn.recv()
+
+
+def run_socket(target: str, paths: list[str], concurrency: int, url: str, cross_rates):
+    # сервер в отдельном процессе, чтобы нагрузчик не делил с ним GIL;
+    # spawn, а не fork: после цели wsgi у batch_executor родителя уже есть
+    # потоки, а в форкнутом процессе его очередь никто не разбирает
+    port = free_port()
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_server, args=(target, port, url, cross_rates), daemon=True
+    )
+    process.start()
+    try:
+        wait_for_port(port)
+        return asyncio.run(
+            run_socket_async(f"http://127.0.0.1:{port}", paths, concurrency)
+        )
+    finally:
+        process.terminate()
+        process.join()
+
+
+def run_load(
+    targets: list[str],
+    requests: int = 10000,
+    concurrency: int = 1000,
+    latency: float = 0.01,
+    error_rate: float = 0.0,
+    codes: int = 160,
+    distinct_codes: int = 20,
+    batch_ratio: float = 0.0,
+    cross_rates: bool = False,
+    alloc_requests: int = 200,
+) -> dict:
+    stub = StubProvider(latency=latency, error_rate=error_rate, codes=codes)
+    url = stub.start_in_thread()
+    use_provider(url, cross_rates)
+    paths = make_paths(stub.codes[:distinct_codes], requests, batch_ratio)
+
+    report = {
+        "config": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "stub_latency_sec": latency,
+            "stub_error_rate": error_rate,
+            "stub_codes": codes,
+            "distinct_codes": distinct_codes,
+            "batch_ratio": batch_ratio,
+            "cross_rates": cross_rates,
+        },
+        "results": {},
+    }
+    alloc_stub, alloc_url = None, url
+    if {"wsgi", "asgi"} & set(targets):
+        alloc_stub, alloc_url = start_stub_process(latency, error_rate, codes)
+    try:
+        for target in targets:
+            stub.requests = 0
+            if target == "wsgi":
+                result = run_wsgi(paths, concurrency, alloc_requests, alloc_url)
+            elif target == "asgi":
+                result = asyncio.run(
+                    run_asgi_async(paths, concurrency, alloc_requests, alloc_url)
+                )
+            else:
+                result = run_socket(target, paths, concurrency, url, cross_rates)
+            result["upstream_calls"] = stub.requests
+            report["results"][target] = result
+    finally:
+        stub.stop_thread()
+        if alloc_stub is not None:
+            alloc_stub.terminate()
+            alloc_stub.join()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон WSGI/ASGI приложений с заглушкой провайдера"
+    )
+    parser.add_argument("--target", choices=TARGETS, action="append")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--codes", type=int, default=160)
+    parser.add_argument("--distinct-codes", type=int, default=20)
+    parser.add_argument("--batch-ratio", type=float, default=0.0)
+    parser.add_argument("--cross-rates", action="store_true")
+    parser.add_argument("--alloc-requests", type=int, default=200)
+    parser.add_argument("--output", help="Файл для JSON-отчёта")
+    args = parser.parse_args()
+
+    report = run_load(
+        targets=args.target or TARGETS,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        codes=args.codes,
+        distinct_codes=args.distinct_codes,
+        batch_ratio=args.batch_ratio,
+        cross_rates=args.cross_rates,
+        alloc_requests=args.alloc_requests,
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from src.asgi_wsgi_stub import StubProvider
+from src.task_6_load import free_port, make_paths, run_socket_async, wait_for_port
+
+APPS = {
+    "wsgi": "src.task_6_wsgi:simple_app",
+    "asgi": "src.task_6_asgi:asgi_app",
+}
+
+
+def start_server(interface: str, workers: int, port: int, url: str, extra=()):
+    env = dict(os.environ, RATES_PROVIDER=url, CROSS_RATES_MODE="1")
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "src.asgi_wsgi_server",
+            APPS[interface],
+            "--interface",
+            interface,
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+            *extra,
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_case(interface, workers, paths, concurrency, url, reload_after=None, extra=()):
+    port = free_port()
+    process = start_server(interface, workers, port, url, extra)
+    try:
+        wait_for_port(port, timeout=30)
+        # ждём, пока поднимутся все воркеры, а не только первый
+        time.sleep(1 + workers * 0.5)
+
+        async def run():
+            load = asyncio.ensure_future(
+                run_socket_async(f"http://127.0.0.1:{port}", paths, concurrency)
+            )
+            if reload_after is not None:
+                await asyncio.sleep(reload_after)
+                process.send_signal(signal.SIGHUP)
+            return await load
+
+        return asyncio.run(run())
+    finally:
+        stop_server(process)
+
+
+def benchmark(
+    worker_counts: list[int],
+    requests: int = 5000,
+    concurrency: int = 200,
+    check_reload: bool = True,
+) -> dict:
+    stub = StubProvider(latency=0.01)
+    url = stub.start_in_thread()
+    paths = make_paths(stub.codes[:20], requests, batch_ratio=0.0)
+
+    report = {"cpu_count": os.cpu_count(), "results": {}}
+    try:
+        for interface in APPS:
+            for workers in worker_counts:
+                result = run_case(interface, workers, paths, concurrency, url)
+                report["results"][f"{interface}_workers_{workers}"] = {
+                    "req_per_sec": result["req_per_sec"],
+                    "p99_ms": result["latency_ms"]["p99"],
+                    "statuses": result["statuses"],
+                }
+
+            if check_reload:
+                # SIGHUP посреди нагрузки и перезапуск воркеров по лимиту запросов
+                result = run_case(
+                    interface,
+                    2,
+                    paths,
+                    concurrency,
+                    url,
+                    reload_after=0.5,
+                    extra=("--max-requests", "1000", "--max-requests-jitter", "200"),
+                )
+                report["results"][f"{interface}_reload"] = {
+                    "req_per_sec": result["req_per_sec"],
+                    "statuses": result["statuses"],
+                }
+                assert set(result["statuses"]) == {"200"}, (interface, result)
+    finally:
+        stub.stop_thread()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Масштабирование встроенного сервера по числу воркеров"
+    )
+    parser.add_argument("--workers", type=int, action="append")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--skip-reload", action="store_true")
+    args = parser.parse_args()
+
+    report = benchmark(
+        worker_counts=args.workers or [1, 2, 4],
+        requests=args.requests,
+        concurrency=args.concurrency,
+        check_reload=not args.skip_reload,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
 import json
-import urllib.error
-import urllib.request
-
-from src.asgi_wsgi_constants import ERROR_MESSAGES, PROVIDER, TIMEOUT
-from src.asgi_wsgi_utils import make_error_message_body
-from src.asgi_wsgi_validators import validate_currency_code
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http import HTTPStatus
+
+from src.asgi_wsgi_breaker import (
+    UPSTREAM_SYNC_ERRORS,
+    CircuitOpenError,
+    guarded_fetch_upstream_bytes,
+    upstream_breaker,
+)
+from src.asgi_wsgi_constants import (
+    BATCH_CONCURRENCY,
+    BATCH_PATH,
+    CROSS_RATES_MODE,
+    ERROR_MESSAGES,
+    HEALTH_PATH,
+)
+from src.asgi_wsgi_rates import UpstreamHTTPError, cross_rate_cache
+from src.asgi_wsgi_responses import prepared_bodies
+from src.asgi_wsgi_utils import make_batch_entry, make_error_message_body
+from src.asgi_wsgi_validators import parse_batch_query, validate_currency_code
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
 
 
 def get_response_headers(data, extra_headers=None):
@@ -19,6 +35,113 @@ def get_response_headers(data, extra_headers=None):
     return headers
 
 
+def get_status_line(status: int) -> str:
+    try:
+        return f"{status} {HTTPStatus(status).phrase}"
+    except ValueError:
+        return str(status)
+
+
+def fetch_cross_rates(code: str) -> tuple[int, bytes]:
+    try:
+        cross_rate_cache.ensure_fresh()
+    except UpstreamHTTPError as e:
+        return e.status, e.body
+
+    data = cross_rate_cache.get(code)
+    if data is None:
+        return 404, make_error_message_body(ERROR_MESSAGES["unsupported_code"])
+    return 200, data
+
+
+def fetch_rates(code: str) -> tuple[int, bytes]:
+    if CROSS_RATES_MODE:
+        return fetch_cross_rates(code)
+    return guarded_fetch_upstream_bytes(code)
+
+
+def serve_prepared(environ, start_response, code, data):
+    entry = prepared_bodies.prepare(code, data)
+    use_gzip = entry.use_gzip(environ.get("HTTP_ACCEPT_ENCODING", ""))
+
+    if entry.matches(environ.get("HTTP_IF_NONE_MATCH", "")):
+        start_response(
+            "304 Not Modified",
+            list(entry.wsgi_not_modified_headers[use_gzip]),
+        )
+        return []
+
+    start_response(
+        "200 OK",
+        list(entry.wsgi_headers[use_gzip]),
+    )
+    return [entry.payload(use_gzip)]
+
+
+def serve_rates(environ, start_response, code):
+    try:
+        status, data = fetch_rates(code)
+    except CircuitOpenError:
+        status = 503
+        data = make_error_message_body(ERROR_MESSAGES["upstream_unavailable"])
+    except UPSTREAM_SYNC_ERRORS:
+        status = 502
+        data = make_error_message_body(ERROR_MESSAGES["bad_gateway"])
+
+    if status == 200:
+        return serve_prepared(environ, start_response, code, data)
+
+    stale = prepared_bodies.get(code)
+    if status >= 500 and stale is not None:
+        # провайдер недоступен - отдаём последнюю успешную таблицу
+        return serve_prepared(environ, start_response, code, stale.body)
+
+    response_headers = get_response_headers(data)
+    start_response(
+        get_status_line(status),
+        response_headers,
+    )
+    return [data]
+
+
+def fetch_batch_entry(code: str, symbols: list[str]) -> bytes:
+    try:
+        status, body = fetch_rates(code)
+    except UPSTREAM_SYNC_ERRORS:
+        status, body = 502, make_error_message_body(ERROR_MESSAGES["bad_gateway"])
+    return make_batch_entry(code, status, body, symbols)
+
+
+def stream_batch(bases: list[str], symbols: list[str]):
+    futures = [
+        batch_executor.submit(fetch_batch_entry, code, symbols) for code in bases
+    ]
+    # открывающая скобка уходит клиенту сразу, таблицы - по мере готовности
+    yield b"{"
+    for i, future in enumerate(as_completed(futures)):
+        yield (b"," if i else b"") + future.result()
+    yield b"}"
+
+
+def serve_batch(query_string, start_response):
+    query = parse_batch_query(query_string)
+    if query is None:
+        body = make_error_message_body(ERROR_MESSAGES["invalid_batch_query"])
+        response_headers = get_response_headers(body)
+        start_response(
+            "400 Bad Request",
+            response_headers,
+        )
+        return [body]
+
+    bases, symbols = query
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Cache-Control", "no-store")],
+    )
+    return stream_batch(bases, symbols)
+
+
 def simple_app(environ, start_response):
     method = environ.get("REQUEST_METHOD", "GET")
     path = environ.get("PATH_INFO", "/")
@@ -32,55 +155,30 @@ def simple_app(environ, start_response):
         )
         return [body]
 
-    code = path.strip("/").upper()
-    if not validate_currency_code(code):
-        body = make_error_message_body(ERROR_MESSAGES["invalid_path"])
-        response_headers = get_response_headers(body)
-        start_response(
-            "400 Bad Request",
-            response_headers,
-        )
-        return [body]
+    if path.rstrip("/") == BATCH_PATH:
+        return serve_batch(environ.get("QUERY_STRING", ""), start_response)
 
-    url = f"{PROVIDER}/v4/latest/{code}"
-
-    try:
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-            data = resp.read()
-            status_code = resp.getcode()
-            reason = (
-                getattr(resp, "reason", "") or "OK"
-                if status_code == 200
-                else (getattr(resp, "reason", "") or "")
-            )
-            response_headers = get_response_headers(data, ("Cache-Control", "no-store"))
-            start_response(
-                f"{status_code} {reason}".strip(),
-                response_headers,
-            )
-            return [data]
-
-    except urllib.error.HTTPError as e:
-        err_body = e.read() or json.dumps({"error": f"Upstream HTTP {e.code}"}).encode()
-        reason = (e.reason if isinstance(e.reason, str) else "") or ""
-        response_headers = get_response_headers(err_body)
+    if path.rstrip("/") == HEALTH_PATH:
+        body = json.dumps({"upstream_breaker": upstream_breaker.snapshot()}).encode()
+        response_headers = get_response_headers(body, ("Cache-Control", "no-store"))
         start_response(
-            f"{e.code} {reason}".strip() or str(e.code),
+            "200 OK",
             response_headers,
         )
-        return [err_body]
+        return [body]
 
-    except urllib.error.URLError:
-        body = make_error_message_body(ERROR_MESSAGES["bad_gateway"])
+    code = path.strip("/").upper()
+    if not validate_currency_code(code):
+        body = make_error_message_body(ERROR_MESSAGES["invalid_path"])
         response_headers = get_response_headers(body)
-
         start_response(
-            "502 Bad Gateway",
+            "400 Bad Request",
             response_headers,
         )
         return [body]
 
+    return serve_rates(environ, start_response, code)
+
 
 def run_wsgi_app(app, environ):
     status_line = ""
@@ -0,0 +1,126 @@
+import json
+import lzma
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Тегированное сообщение: MAGIC + тег формата + тег сжатия + данные.
+# 0xff не встречается в начале UTF-8 JSON, поэтому старые сообщения
+# (просто json.dumps) однозначно отличаются от новых.
+MAGIC = b"\xff"
+
+FORMATS = {"json": b"j", "msgpack": b"m"}
+COMPRESSIONS = {None: b"-", "zlib": b"z", "lzma": b"x"}
+
+
+class CodecError(Exception):
+    pass
+
+
+def dump_json(msg) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode()
+
+
+def dump_msgpack(msg) -> bytes:
+    return msgpack.packb(msg, use_bin_type=True)
+
+
+def load_msgpack(data: bytes):
+    return msgpack.unpackb(data, raw=False)
+
+
+DUMPERS = {b"j": dump_json, b"m": dump_msgpack}
+LOADERS = {b"j": json.loads, b"m": load_msgpack}
+COMPRESSORS = {
+    b"z": lambda data, level: zlib.compress(data, 6 if level is None else level),
+    b"x": lambda data, level: lzma.compress(data, preset=0 if level is None else level),
+}
+DECOMPRESSORS = {b"z": zlib.decompress, b"x": lzma.decompress}
+
+
+class MessageCodec:
+    """Сериализация сообщений очереди.
+
+    Сообщения, не дотянувшие до compress_threshold, не сжимаются.
+    JSON без сжатия пишется без тега, в старом формате, чтобы его
+    читали консьюмеры, ещё не знающие про кодеки.
+    """
+
+    def __init__(
+        self,
+        format: str = "json",
+        compression: str | None = None,
+        compress_threshold: int = 1024,
+        level: int | None = None,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format!r}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}")
+        if format == "msgpack" and msgpack is None:
+            raise CodecError("msgpack format requires the msgpack package")
+
+        self.format = format
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self.format_tag = FORMATS[format]
+        self.compression_tag = COMPRESSIONS[compression]
+
+    def encode(self, msg) -> bytes:
+        data = DUMPERS[self.format_tag](msg)
+        compression_tag = COMPRESSIONS[None]
+        if self.compression and len(data) >= self.compress_threshold:
+            data = COMPRESSORS[self.compression_tag](data, self.level)
+            compression_tag = self.compression_tag
+        elif self.format_tag == FORMATS["json"]:
+            return data
+        return MAGIC + self.format_tag + compression_tag + data
+
+    def decode(self, data: bytes):
+        return decode_message(data)
+
+
+def decode_message(data: bytes | str):
+    """Декодирует сообщение любого известного формата, включая старый JSON."""
+    if isinstance(data, str) or not data.startswith(MAGIC):
+        return json.loads(data)
+
+    format_tag, compression_tag = data[1:2], data[2:3]
+    payload = data[3:]
+    if compression_tag != COMPRESSIONS[None]:
+        if compression_tag not in DECOMPRESSORS:
+            raise CodecError(f"Unknown compression tag {compression_tag!r}")
+        payload = DECOMPRESSORS[compression_tag](payload)
+
+    if format_tag not in LOADERS:
+        raise CodecError(f"Unknown format tag {format_tag!r}")
+    if format_tag == FORMATS["msgpack"] and msgpack is None:
+        raise CodecError("msgpack message requires the msgpack package")
+    return LOADERS[format_tag](payload)
+
+
+if __name__ == "__main__":
+    msg = {"id": 1, "items": [{"sku": f"A{i}", "qty": i} for i in range(100)]}
+    legacy = json.dumps(msg).encode()
+
+    for codec in (
+        MessageCodec(),
+        MessageCodec(compression="zlib"),
+        MessageCodec(compression="lzma"),
+        MessageCodec(compression="zlib", compress_threshold=10**9),
+    ):
+        assert decode_message(codec.encode(msg)) == msg
+
+    # без сжатия JSON остаётся в старом формате
+    assert MessageCodec().encode(msg) == dump_json(msg)
+    assert decode_message(legacy) == msg
+    assert decode_message(legacy.decode()) == msg
+
+    if msgpack is not None:
+        for compression in (None, "zlib", "lzma"):
+            codec = MessageCodec("msgpack", compression)
+            assert decode_message(codec.encode(msg)) == msg
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import json
+import time
+
+from config import async_redis_obj, redis_obj
+from task_distributed_lock import async_single, single
+from task_rate_limiter import AsyncRateLimiter
+
+
+class LoopLagMonitor:
+    """Фоновая задача, которая замечает, насколько цикл событий запаздывает."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.task = None
+
+    def tick(self):
+        lag = time.perf_counter() - self.tick_start - self.interval
+        self.max_lag = max(self.max_lag, lag)
+
+    async def run(self):
+        while True:
+            self.tick_start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.tick()
+
+    def __enter__(self):
+        self.tick_start = time.perf_counter()
+        self.task = asyncio.ensure_future(self.run())
+        return self
+
+    def __exit__(self, *exc):
+        # цикл мог быть заблокирован до самого конца замера
+        self.tick()
+        self.task.cancel()
+
+
+async def bench_async_lock(tasks: int, work: float) -> dict:
+    @async_single(
+        max_processing_time=datetime.timedelta(seconds=10),
+        redis_client=async_redis_obj,
+        retry_interval=0.005,
+    )
+    async def locked():
+        await asyncio.sleep(work)
+
+    with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(locked() for _ in range(tasks)))
+        elapsed = time.perf_counter() - start
+    return {
+        "acquisitions_per_sec": round(tasks / elapsed, 1),
+        "ideal_per_sec": round(1 / work, 1),
+        "max_loop_lag_ms": round(monitor.max_lag * 1000, 2),
+    }
+
+
+async def bench_sync_lock_in_loop(tasks: int, work: float) -> dict:
+    # синхронный single внутри корутины: каждый вызов блокирует весь цикл
+    @single(max_processing_time=datetime.timedelta(seconds=10), redis_client=redis_obj)
+    def locked():
+        time.sleep(work)
+
+    async def call():
+        locked()
+
+    with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(tasks)))
+        elapsed = time.perf_counter() - start
+    return {
+        "acquisitions_per_sec": round(tasks / elapsed, 1),
+        "max_loop_lag_ms": round(monitor.max_lag * 1000, 2),
+    }
+
+
+async def bench_rate_limiter(tasks: int, limit: int) -> dict:
+    limiter = AsyncRateLimiter(
+        async_redis_obj,
+        key="bench:ratelimit:async",
+        window_seconds=1.0,
+        limit=limit,
+        algorithm="gcra",
+    )
+    await async_redis_obj.delete(limiter.key)
+    checks = 0
+    original_check = limiter.check
+
+    async def counted_check(*subkeys):
+        nonlocal checks
+        checks += 1
+        return await original_check(*subkeys)
+
+    limiter.check = counted_check
+
+    with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(limiter.acquire() for _ in range(tasks)))
+        elapsed = time.perf_counter() - start
+    return {
+        # GCRA сразу отдаёт limit разрешений, дальше limit в секунду
+        "elapsed_sec": round(elapsed, 2),
+        "ideal_elapsed_sec": round((tasks - limit) / limit, 2),
+        "checks_per_permit": round(checks / tasks, 2),
+        "max_loop_lag_ms": round(monitor.max_lag * 1000, 2),
+    }
+
+
+async def benchmark() -> dict:
+    try:
+        return {
+            "async_single_200_tasks": await bench_async_lock(200, work=0.005),
+            "sync_single_in_loop_200_tasks": await bench_sync_lock_in_loop(
+                200, work=0.005
+            ),
+            "async_acquire_1500_tasks": await bench_rate_limiter(1500, limit=500),
+        }
+    finally:
+        await async_redis_obj.aclose()
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(benchmark()), indent=2))
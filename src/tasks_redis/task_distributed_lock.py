@@ -1,12 +1,15 @@
+import asyncio
+import contextvars
 import datetime
-import random
 import threading
 import time
 import uuid
+import weakref
 from functools import wraps
 
 import redis
-from config import redis_obj
+import redis.asyncio
+from config import async_redis_obj, redis_obj
 
 
 class AlreadyRunning(Exception):
@@ -23,24 +26,240 @@ def get_thread_maps():
     return thread_local.held_counts, thread_local.tokens
 
 
-def release_lock(r: redis.Redis, key: str, token: str, retries: int = 5) -> bool:
-    for _ in range(retries):
-        pipe = r.pipeline()
-        try:
-            pipe.watch(key)
-            val = pipe.get(key)
-            if val is None or val.decode() != token:
-                pipe.unwatch()
-                return False
-            pipe.multi()
-            pipe.delete(key)
-            pipe.execute()
-            return True
-        except redis.WatchError:
-            continue
-        finally:
-            pipe.reset()
-    return False
+# Захват: SET NX PX, а при неудаче - сколько ещё проживёт чужая блокировка
+ACQUIRE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return {1, 0}
+end
+return {0, redis.call('PTTL', KEYS[1])}
+"""
+
+# Удаление ключа, только если он всё ещё наш, и сигнал одному ожидающему.
+# В списке пробуждений держится не больше limit сигналов.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[2], 1)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[3]), -1)
+redis.call('PEXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# Продление TTL, только если блокировка всё ещё наша
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Семафор: ZSET владельцев со временем истечения в score
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return {1, 0}
+end
+local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, tonumber(first[2]) - now}
+"""
+
+SEMAPHORE_RELEASE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[2], 1)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[3]), -1)
+redis.call('PEXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+SEMAPHORE_EXTEND_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[2]), ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+WAKE_TTL_MS = 60_000
+
+
+class RedisLock:
+    """Блокировка на одном ключе Redis; при limit > 1 - семафор на limit владельцев.
+
+    Ожидающие не опрашивают Redis, а ждут в BLPOP на списке пробуждений
+    "<key>:wake", куда release кладёт сигнал. Таймаут BLPOP равен
+    оставшемуся TTL блокировки - на случай, если владелец упал и
+    никого не разбудил.
+    """
+
+    def __init__(self, redis_client, key: str, ttl_ms: int, limit: int = 1):
+        self.redis_client = redis_client
+        self.key = key
+        self.wake_key = f"{key}:wake"
+        self.ttl_ms = ttl_ms
+        self.limit = limit
+        if limit == 1:
+            scripts = ACQUIRE_SCRIPT, RELEASE_SCRIPT, EXTEND_SCRIPT
+        else:
+            scripts = (
+                SEMAPHORE_ACQUIRE_SCRIPT,
+                SEMAPHORE_RELEASE_SCRIPT,
+                SEMAPHORE_EXTEND_SCRIPT,
+            )
+        self.acquire_script, self.release_script, self.extend_script = (
+            redis_client.register_script(script) for script in scripts
+        )
+
+    def wait_time(self, pttl: int, deadline: float | None, retry_interval: float):
+        timeout = pttl / 1000 if pttl > 0 else retry_interval
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for lock {self.key}")
+            timeout = min(timeout, remaining)
+        # BLPOP с нулевым таймаутом ждёт бесконечно
+        return max(timeout, 0.01)
+
+    def acquire(
+        self,
+        token: str,
+        wait_timeout: float | None = None,
+        retry_interval: float = 0.1,
+    ):
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        while True:
+            acquired, pttl = self.acquire_script(
+                keys=[self.key], args=[token, self.ttl_ms, self.limit]
+            )
+            if acquired:
+                return
+            if wait_timeout == 0:
+                raise AlreadyRunning(f"Function is already running (lock={self.key})")
+            timeout = self.wait_time(pttl, deadline, retry_interval)
+            self.redis_client.blpop([self.wake_key], timeout=timeout)
+
+    def release(self, token: str) -> bool:
+        return bool(
+            self.release_script(
+                keys=[self.key, self.wake_key], args=[token, WAKE_TTL_MS, self.limit]
+            )
+        )
+
+    def extend(self, token: str) -> bool:
+        return bool(self.extend_script(keys=[self.key], args=[token, self.ttl_ms]))
+
+
+class AsyncRedisLock(RedisLock):
+    async def acquire(
+        self,
+        token: str,
+        wait_timeout: float | None = None,
+        retry_interval: float = 0.1,
+    ):
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        while True:
+            acquired, pttl = await self.acquire_script(
+                keys=[self.key], args=[token, self.ttl_ms, self.limit]
+            )
+            if acquired:
+                return
+            if wait_timeout == 0:
+                raise AlreadyRunning(f"Function is already running (lock={self.key})")
+            timeout = self.wait_time(pttl, deadline, retry_interval)
+            await self.redis_client.blpop([self.wake_key], timeout=timeout)
+
+    async def release(self, token: str) -> bool:
+        return bool(
+            await self.release_script(
+                keys=[self.key, self.wake_key], args=[token, WAKE_TTL_MS, self.limit]
+            )
+        )
+
+    async def extend(self, token: str) -> bool:
+        return bool(
+            await self.extend_script(keys=[self.key], args=[token, self.ttl_ms])
+        )
+
+
+class LockWatchdog(threading.Thread):
+    """Продлевает TTL блокировки каждые ttl/3, пока владелец работает."""
+
+    def __init__(self, lock: RedisLock, token: str):
+        super().__init__(daemon=True)
+        self.lock = lock
+        self.token = token
+        self.interval = lock.ttl_ms / 3000
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.lock.extend(self.token):
+                # блокировку уже забрали, продлевать нечего
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+async def renew_lock(lock: AsyncRedisLock, token: str):
+    while True:
+        await asyncio.sleep(lock.ttl_ms / 3000)
+        if not await lock.extend(token):
+            return
+
+
+def make_lock_keys(base_key: str, key_func, args, kwargs) -> list[str]:
+    """Ключи блокировок для вызова: один на функцию или по key_func.
+
+    key_func возвращает одно значение или list/tuple/set/frozenset
+    значений; ключи сортируются, чтобы все вызовы захватывали их в одном
+    порядке и не блокировали друг друга взаимно.
+    """
+    if key_func is None:
+        return [base_key]
+    value = key_func(*args, **kwargs)
+    values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    return sorted({f"{base_key}:{item}" for item in values})
+
+
+def remaining_timeout(wait_timeout: float | None, deadline: float | None):
+    if deadline is None or wait_timeout == 0:
+        return wait_timeout
+    return max(0.001, deadline - time.monotonic())
+
+
+thread_locks: weakref.WeakValueDictionary[str, threading.BoundedSemaphore] = (
+    weakref.WeakValueDictionary()
+)
+thread_locks_guard = threading.Lock()
+
+
+def acquire_thread_lock(lock_key: str, limit: int, wait_timeout, deadline):
+    # потоки этого процесса ждут очереди локально: в BLPOP на ключ сидит
+    # не больше limit из них, и ожидающие не занимают весь пул соединений,
+    # пока владельцу нужно соединение, чтобы освободить блокировку
+    with thread_locks_guard:
+        local_lock = thread_locks.get(lock_key)
+        if local_lock is None:
+            local_lock = thread_locks[lock_key] = threading.BoundedSemaphore(limit)
+
+    if wait_timeout == 0:
+        if not local_lock.acquire(blocking=False):
+            raise AlreadyRunning(f"Function is already running (lock={lock_key})")
+    elif not local_lock.acquire(timeout=remaining_timeout(wait_timeout, deadline)):
+        raise TimeoutError(f"Timed out waiting for lock {lock_key}")
+    return local_lock
 
 
 def single(
@@ -48,53 +267,197 @@ def single(
     redis_client: redis.Redis | None = None,
     wait_timeout: float | None = None,
     retry_interval: float = 0.1,
+    auto_renew: bool = False,
+    key=None,
+    limit: int = 1,
 ):
+    """Не даёт функции выполняться одновременно в нескольких потоках и процессах.
+
+    С auto_renew max_processing_time - это TTL, который продлевается,
+    пока функция работает; он нужен только на случай падения процесса.
+    key(*args, **kwargs) сужает блокировку до значений аргументов
+    (например, key=lambda account_id: account_id), limit > 1 пускает
+    до limit одновременных владельцев на ключ.
+    """
     if max_processing_time <= datetime.timedelta(0):
         raise ValueError("max_processing_time must be > 0")
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
     ttl_ms = int(max_processing_time.total_seconds() * 1000)
 
     def decorator(func):
-        lock_key = f"single:{func.__module__}.{func.__qualname__}"
+        base_key = f"single:{func.__module__}.{func.__qualname__}"
+
+        def acquire(lock_key: str, deadline: float | None):
+            local_lock = acquire_thread_lock(lock_key, limit, wait_timeout, deadline)
+            lock = RedisLock(redis_client, lock_key, ttl_ms, limit)
+            token = uuid.uuid4().hex
+            try:
+                lock.acquire(
+                    token, remaining_timeout(wait_timeout, deadline), retry_interval
+                )
+            except BaseException:
+                local_lock.release()
+                raise
+            watchdog = None
+            if auto_renew:
+                watchdog = LockWatchdog(lock, token)
+                watchdog.start()
+            return lock, token, watchdog, local_lock
+
+        def release(lock: RedisLock, token: str, watchdog, local_lock):
+            try:
+                if watchdog is not None:
+                    watchdog.stop()
+                lock.release(token)
+            finally:
+                local_lock.release()
 
         @wraps(func)
         def wrapper(*args, **kwargs):
             if redis_client is None:
                 raise RuntimeError("Redis client is not configured")
 
+            lock_keys = make_lock_keys(base_key, key, args, kwargs)
             held, tokens = get_thread_maps()
-            reentrant = held.get(lock_key, 0) > 0
+            deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
 
-            if not reentrant:
-                token = uuid.uuid4().hex
-                deadline = (
-                    None if wait_timeout is None else time.monotonic() + wait_timeout
-                )
+            acquired = []
+            try:
+                for lock_key in lock_keys:
+                    if held.get(lock_key, 0) == 0:
+                        tokens[lock_key] = acquire(lock_key, deadline)
+                        acquired.append(lock_key)
+            except BaseException:
+                for lock_key in reversed(acquired):
+                    release(*tokens.pop(lock_key))
+                raise
 
-                while True:
-                    if redis_client.set(lock_key, token, nx=True, px=ttl_ms):
-                        tokens[lock_key] = token
-                        break
+            for lock_key in lock_keys:
+                held[lock_key] = held.get(lock_key, 0) + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for lock_key in reversed(lock_keys):
+                    held[lock_key] -= 1
+                    if held[lock_key] == 0:
+                        del held[lock_key]
+                        release(*tokens.pop(lock_key))
+
+        return wrapper
 
-                    if wait_timeout == 0:
-                        raise AlreadyRunning(
-                            f"Function is already running (lock={lock_key})"
-                        )
+    return decorator
 
-                    if deadline is not None and time.monotonic() >= deadline:
-                        raise TimeoutError(f"Timed out waiting for lock {lock_key}")
 
-                    time.sleep(retry_interval + random.random() * retry_interval)
+# Ключи блокировок, которые держит текущая задача: ключ -> (токен, задача).
+# Дочерние задачи получают копию контекста при создании, поэтому
+# реентерабельным считается только вызов из задачи-владельца.
+held_locks: contextvars.ContextVar[dict[str, tuple[str, asyncio.Task]] | None] = (
+    contextvars.ContextVar("held_locks", default=None)
+)
 
-            held[lock_key] = held.get(lock_key, 0) + 1
+local_locks: weakref.WeakValueDictionary[str, asyncio.Semaphore] = (
+    weakref.WeakValueDictionary()
+)
+
+
+async def acquire_local(lock_key: str, limit: int, wait_timeout, deadline):
+    # задачи этого процесса ждут очереди локально, и в Redis
+    # блокировку ждёт не больше limit из них
+    local_lock = local_locks.get(lock_key)
+    if local_lock is None:
+        local_lock = local_locks[lock_key] = asyncio.Semaphore(limit)
+    if wait_timeout == 0 and local_lock.locked():
+        raise AlreadyRunning(f"Function is already running (lock={lock_key})")
+
+    if not wait_timeout:
+        await local_lock.acquire()
+    else:
+        try:
+            await asyncio.wait_for(
+                local_lock.acquire(), remaining_timeout(wait_timeout, deadline)
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out waiting for lock {lock_key}") from None
+    return local_lock
+
+
+def async_single(
+    max_processing_time: datetime.timedelta,
+    redis_client: redis.asyncio.Redis | None = None,
+    wait_timeout: float | None = None,
+    retry_interval: float = 0.1,
+    auto_renew: bool = False,
+    key=None,
+    limit: int = 1,
+):
+    """Вариант single для корутин на redis.asyncio.
+
+    Реентерабельность отслеживается по задаче, а не по потоку: в одном
+    потоке цикла событий много задач. Задачи, созданные под блокировкой,
+    её не наследуют и ждут её как любые другие.
+    """
+    if max_processing_time <= datetime.timedelta(0):
+        raise ValueError("max_processing_time must be > 0")
+    if limit < 1:
+        raise ValueError("limit must be >= 1")
+    ttl_ms = int(max_processing_time.total_seconds() * 1000)
+
+    def decorator(func):
+        base_key = f"single:{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if redis_client is None:
+                raise RuntimeError("Redis client is not configured")
+
+            held = held_locks.get() or {}
+            task = asyncio.current_task()
+            lock_keys = [
+                lock_key
+                for lock_key in make_lock_keys(base_key, key, args, kwargs)
+                if held.get(lock_key, (None, None))[1] is not task
+            ]
+            if not lock_keys:
+                return await func(*args, **kwargs)
+
+            deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+            local_acquired = []
+            acquired = {}
             try:
-                return func(*args, **kwargs)
+                for lock_key in lock_keys:
+                    local_acquired.append(
+                        await acquire_local(lock_key, limit, wait_timeout, deadline)
+                    )
+                    lock = AsyncRedisLock(redis_client, lock_key, ttl_ms, limit)
+                    token = uuid.uuid4().hex
+                    await lock.acquire(
+                        token, remaining_timeout(wait_timeout, deadline), retry_interval
+                    )
+                    renewal = (
+                        asyncio.ensure_future(renew_lock(lock, token))
+                        if auto_renew
+                        else None
+                    )
+                    acquired[lock_key] = (lock, token, renewal)
+
+                context_token = held_locks.set(
+                    {
+                        **held,
+                        **{k: (token, task) for k, (_, token, _) in acquired.items()},
+                    }
+                )
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    held_locks.reset(context_token)
             finally:
-                held[lock_key] -= 1
-                if held[lock_key] == 0:
-                    del held[lock_key]
-                    tok = tokens.pop(lock_key, None)
-                    if tok is not None:
-                        release_lock(redis_client, lock_key, tok)
+                for lock, token, renewal in reversed(acquired.values()):
+                    if renewal is not None:
+                        renewal.cancel()
+                    await lock.release(token)
+                for local_lock in reversed(local_acquired):
+                    local_lock.release()
 
         return wrapper
 
@@ -134,3 +497,140 @@ if __name__ == "__main__":
 
     for t in threads:
         t.join()
+
+    print("\nПродление TTL для долгой функции\n")
+
+    @single(
+        max_processing_time=datetime.timedelta(seconds=0.3),
+        redis_client=redis_obj,
+        auto_renew=True,
+    )
+    def long_job():
+        time.sleep(1)
+
+    # та же функция с wait_timeout=0 - тот же ключ блокировки
+    long_job_probe = single(
+        max_processing_time=datetime.timedelta(seconds=0.3),
+        redis_client=redis_obj,
+        wait_timeout=0,
+    )(long_job.__wrapped__)
+
+    worker = threading.Thread(target=long_job)
+    worker.start()
+    time.sleep(0.8)
+    try:
+        long_job_probe()
+    except AlreadyRunning:
+        print("lock is still held after 0.8s with ttl 0.3s")
+    else:
+        raise AssertionError("watchdog did not extend the lock")
+    worker.join()
+    long_job_probe()
+
+    print("\nБлокировка по аргументам\n")
+
+    @single(
+        max_processing_time=datetime.timedelta(minutes=2),
+        redis_client=redis_obj,
+        key=lambda source, target: (source, target),
+    )
+    def transfer(source: str, target: str):
+        time.sleep(0.3)
+
+    # встречные переводы берут ключи в одном порядке и не блокируют друг друга
+    started = time.monotonic()
+    transfers = [
+        threading.Thread(target=transfer, args=pair)
+        for pair in (("a", "b"), ("b", "a"), ("c", "d"))
+    ]
+    for t in transfers:
+        t.start()
+    for t in transfers:
+        t.join()
+    elapsed = time.monotonic() - started
+    print(f"3 transfers, 2 conflicting: {elapsed:.2f}s")
+    assert 0.6 <= elapsed < 0.9, elapsed
+
+    # ключом может быть любое значение, не только строка
+    assert make_lock_keys("k", lambda account_id: account_id, (42,), {}) == ["k:42"]
+    assert make_lock_keys("k", lambda a, b: (b, a), (2, 1), {}) == ["k:1", "k:2"]
+
+    print("\nСемафор на 2 владельцев\n")
+
+    running = []
+
+    @single(
+        max_processing_time=datetime.timedelta(minutes=2),
+        redis_client=redis_obj,
+        limit=2,
+    )
+    def limited_job():
+        running.append(1)
+        assert len(running) <= 2, len(running)
+        time.sleep(0.3)
+        running.pop()
+
+    started = time.monotonic()
+    jobs = [threading.Thread(target=limited_job) for _ in range(4)]
+    for t in jobs:
+        t.start()
+    for t in jobs:
+        t.join()
+    elapsed = time.monotonic() - started
+    print(f"4 jobs with limit 2: {elapsed:.2f}s")
+    assert 0.6 <= elapsed < 0.9, elapsed
+
+    print("\nНесколько задач asyncio\n")
+
+    @async_single(
+        max_processing_time=datetime.timedelta(minutes=2),
+        redis_client=async_redis_obj,
+    )
+    async def process_transaction_async(depth: int = 0):
+        if depth:
+            # повторный вход в той же задаче не ждёт собственную блокировку
+            return await process_transaction_async(depth - 1)
+        print("Current time:", datetime.datetime.now())
+        await asyncio.sleep(0.5)
+
+    @async_single(
+        max_processing_time=datetime.timedelta(minutes=2),
+        redis_client=async_redis_obj,
+        key=lambda account_id: account_id,
+        limit=2,
+    )
+    async def charge(account_id: str):
+        await asyncio.sleep(0.3)
+
+    running = {"now": 0, "max": 0}
+    spawned = []
+
+    @async_single(
+        max_processing_time=datetime.timedelta(minutes=2),
+        redis_client=async_redis_obj,
+    )
+    async def settle(spawn: bool = False):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        if spawn:
+            # задачи, созданные под блокировкой, её не наследуют
+            spawned.extend(asyncio.ensure_future(settle()) for _ in range(2))
+        await asyncio.sleep(0.1)
+        running["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(process_transaction_async(1) for _ in range(3)))
+
+        started = time.monotonic()
+        await asyncio.gather(*(charge(account) for account in "aaaabb"))
+        elapsed = time.monotonic() - started
+        print(f"6 charges on 2 accounts with limit 2: {elapsed:.2f}s")
+        assert 0.6 <= elapsed < 0.9, elapsed
+
+        await settle(spawn=True)
+        await asyncio.gather(*spawned)
+        assert running["max"] == 1, running
+
+        await async_redis_obj.aclose()
+
+    asyncio.run(main())
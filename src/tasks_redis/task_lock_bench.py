@@ -0,0 +1,109 @@
+import datetime
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+
+import redis
+from config import redis_obj
+from task_distributed_lock import single
+
+KEY_PREFIX = "bench:lock"
+
+
+def polling_single(
+    max_processing_time: datetime.timedelta, redis_client, retry_interval=0.1
+):
+    """Прежний single: опрос SET NX со сном и освобождение через WATCH."""
+    ttl_ms = int(max_processing_time.total_seconds() * 1000)
+
+    def decorator(func):
+        lock_key = f"single:{func.__module__}.{func.__qualname__}"
+
+        def wrapper(*args, **kwargs):
+            token = uuid.uuid4().hex
+            while not redis_client.set(lock_key, token, nx=True, px=ttl_ms):
+                time.sleep(retry_interval + random.random() * retry_interval)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with redis_client.pipeline() as pipe:
+                    try:
+                        pipe.watch(lock_key)
+                        if pipe.get(lock_key) == token.encode():
+                            pipe.multi()
+                            pipe.delete(lock_key)
+                            pipe.execute()
+                    except redis.WatchError:
+                        pass
+
+        return wrapper
+
+    return decorator
+
+
+def run(decorator, workers: int, acquisitions: int, work: float) -> dict:
+    state = {"released_at": None}
+    handoffs = []
+
+    def critical_section():
+        acquired_at = time.perf_counter()
+        if state["released_at"] is not None:
+            handoffs.append(acquired_at - state["released_at"])
+        time.sleep(work)
+        state["released_at"] = time.perf_counter()
+
+    critical_section.__qualname__ = f"{KEY_PREFIX}.{uuid.uuid4().hex}"
+    locked = decorator(critical_section)
+
+    per_worker = acquisitions // workers
+
+    def worker():
+        for _ in range(per_worker):
+            locked()
+
+    commands_before = redis_obj.info("stats")["total_commands_processed"]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    commands = redis_obj.info("stats")["total_commands_processed"] - commands_before - 1
+
+    total = per_worker * workers
+    handoffs.sort()
+    return {
+        "acquisitions_per_sec": round(total / elapsed, 1),
+        "handoff_ms": {
+            "p50": round(statistics.median(handoffs) * 1000, 2),
+            "p99": round(handoffs[int(len(handoffs) * 0.99)] * 1000, 2),
+        },
+        # команды внутри Lua-скриптов Redis тоже считает
+        "redis_ops_per_acquisition": round(commands / total, 1),
+    }
+
+
+def benchmark(workers: int = 50, acquisitions: int = 500, work: float = 0.002) -> dict:
+    ttl = datetime.timedelta(seconds=10)
+    return {
+        "polling_watch_release": run(
+            polling_single(ttl, redis_obj), workers, acquisitions // 5, work
+        ),
+        "blpop_wakeup_lua_release": run(
+            single(ttl, redis_client=redis_obj), workers, acquisitions, work
+        ),
+        "blpop_wakeup_auto_renew": run(
+            single(ttl, redis_client=redis_obj, auto_renew=True),
+            workers,
+            acquisitions,
+            work,
+        ),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,79 @@
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+
+from config import redis_obj
+from task_distributed_lock import single
+
+KEY_PREFIX = "bench:lock_keyed"
+
+
+def run(workers: int, acquisitions: int, accounts: int, work: float, **options):
+    """Потоки обрабатывают операции по случайным счетам под single(**options)."""
+    concurrent = {"now": 0, "max": 0}
+    guard = threading.Lock()
+
+    def process(*account_ids):
+        with guard:
+            concurrent["now"] += 1
+            concurrent["max"] = max(concurrent["max"], concurrent["now"])
+        time.sleep(work)
+        with guard:
+            concurrent["now"] -= 1
+
+    process.__qualname__ = f"{KEY_PREFIX}.{uuid.uuid4().hex}"
+    locked = single(datetime.timedelta(seconds=10), redis_client=redis_obj, **options)(
+        process
+    )
+
+    per_worker = acquisitions // workers
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        for _ in range(per_worker):
+            if options.get("key") is transfer_key:
+                locked(*rnd.sample(range(accounts), 2))
+            else:
+                locked(rnd.randrange(accounts))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_sec": round(per_worker * workers / elapsed, 1),
+        "max_concurrent": concurrent["max"],
+    }
+
+
+def account_key(account_id):
+    return account_id
+
+
+def transfer_key(source, target):
+    return (source, target)
+
+
+def benchmark(
+    workers: int = 50, acquisitions: int = 1000, accounts: int = 1000, work=0.01
+) -> dict:
+    return {
+        "global_lock": run(workers, acquisitions // 5, accounts, work),
+        "global_semaphore_8": run(workers, acquisitions, accounts, work, limit=8),
+        "keyed_lock": run(workers, acquisitions, accounts, work, key=account_key),
+        "keyed_lock_hot_keys": run(workers, acquisitions, 5, work, key=account_key),
+        "keyed_transfer_two_keys": run(
+            workers, acquisitions, accounts, work, key=transfer_key
+        ),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
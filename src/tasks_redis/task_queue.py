@@ -1,20 +1,244 @@
-import json
+import os
+import socket
+import time
 
 import redis
 from config import redis_obj
+from message_codecs import MessageCodec, decode_message
+
+# Забирает зависшие сообщения: XAUTOCLAIM JUSTID отдаёт id всех забранных
+# (без JUSTID Redis 6.2 возвращает удалённые из стрима записи без id),
+# XCLAIM по каждому id - поля и +1 к счётчику доставок, XPENDING по тому же
+# id - значение счётчика. Удалённые записи Redis 6.2 держит в PEL, их
+# подтверждаем сразу.
+RECLAIM_SCRIPT = """
+local claimed = redis.call(
+    'XAUTOCLAIM', KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4],
+    'COUNT', ARGV[5], 'JUSTID'
+)
+local entries, deleted = {}, {}
+for _, id in ipairs(claimed[2]) do
+    local entry = redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[2], 0, id)[1]
+    if entry then
+        local pending = redis.call('XPENDING', KEYS[1], ARGV[1], id, id, 1)[1]
+        table.insert(entries, {id, entry[2], pending[4]})
+    else
+        table.insert(deleted, id)
+    end
+end
+if #deleted > 0 then
+    redis.call('XACK', KEYS[1], ARGV[1], unpack(deleted))
+end
+return {claimed[1], entries}
+"""
 
 
 class RedisQueue:
-    def __init__(self, redis_ins: redis.Redis):
+    def __init__(
+        self,
+        redis_ins: redis.Redis,
+        key: str = "queue1",
+        codec: MessageCodec | None = None,
+    ):
         self.redis_ins = redis_ins
-        self.key = "queue1"
+        self.key = key
+        self.codec = codec or MessageCodec()
 
     def publish(self, msg: dict):
-        self.redis_ins.rpush(self.key, json.dumps(msg))
+        self.redis_ins.rpush(self.key, self.codec.encode(msg))
+
+    def publish_many(self, msgs: list[dict], chunk_size: int = 1000) -> int:
+        """Публикует пачку сообщений за один round trip.
+
+        Большие пачки режутся на RPUSH по chunk_size элементов,
+        чтобы не собирать в Redis одну гигантскую команду.
+        """
+        if not msgs:
+            return 0
+        pipe = self.redis_ins.pipeline(transaction=False)
+        for start in range(0, len(msgs), chunk_size):
+            chunk = msgs[start : start + chunk_size]
+            pipe.rpush(self.key, *(self.codec.encode(msg) for msg in chunk))
+        pipe.execute()
+        return len(msgs)
+
+    def consume(self, timeout: float | None = None) -> dict | None:
+        """Забирает одно сообщение; None, если очередь пуста.
+
+        При timeout ждёт сообщение через BLPOP не дольше timeout секунд
+        (timeout=0 - ждать бесконечно).
+        """
+        if timeout is None:
+            msg = self.redis_ins.lpop(self.key)
+        else:
+            item = self.redis_ins.blpop([self.key], timeout=timeout)
+            msg = item[1] if item else None
+        return None if msg is None else decode_message(msg)
+
+    def consume_many(self, n: int, timeout: float | None = None) -> list[dict]:
+        """Забирает до n сообщений за один LPOP с count.
+
+        При timeout блокируется до появления первого сообщения,
+        остальные добирает без ожидания.
+        """
+        if timeout is None:
+            msgs = self.redis_ins.lpop(self.key, n) or []
+        else:
+            item = self.redis_ins.blpop([self.key], timeout=timeout)
+            if item is None:
+                return []
+            msgs = [item[1]]
+            if n > 1:
+                msgs.extend(self.redis_ins.lpop(self.key, n - 1) or [])
+        return [decode_message(msg) for msg in msgs]
+
+    def __len__(self) -> int:
+        return self.redis_ins.llen(self.key)
+
+
+class ReliableRedisQueue:
+    """Очередь с подтверждением доставки (at-least-once) на Redis Streams.
+
+    Сообщение остаётся в PEL группы, пока его не подтвердят через ack.
+    Если консьюмер упал, сообщение после visibility_timeout забирает
+    другой консьюмер (XAUTOCLAIM); после max_deliveries попыток оно
+    уходит в dead-letter стрим.
+    """
+
+    def __init__(
+        self,
+        redis_ins: redis.Redis,
+        key: str = "queue1:stream",
+        group: str = "workers",
+        consumer: str | None = None,
+        visibility_timeout: float = 30.0,
+        max_deliveries: int = 5,
+        maxlen: int | None = 100_000,
+        dead_letter_key: str | None = None,
+        codec: MessageCodec | None = None,
+    ):
+        self.redis_ins = redis_ins
+        self.codec = codec or MessageCodec()
+        self.key = key
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.visibility_ms = int(visibility_timeout * 1000)
+        self.max_deliveries = max_deliveries
+        self.maxlen = maxlen
+        self.dead_letter_key = dead_letter_key or f"{key}:dead"
+        # как часто искать зависшие сообщения чужих консьюмеров
+        self.reclaim_interval = visibility_timeout / 4
+        self.last_reclaim = 0.0
+        self.claim_cursor = "0-0"
+        self.reclaim_script = redis_ins.register_script(RECLAIM_SCRIPT)
+        self.ensure_group()
+
+    def ensure_group(self):
+        try:
+            self.redis_ins.xgroup_create(self.key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def publish(self, msg: dict) -> str:
+        msg_id = self.redis_ins.xadd(
+            self.key,
+            {"data": self.codec.encode(msg)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        return msg_id.decode()
+
+    def publish_many(self, msgs: list[dict]) -> list[str]:
+        pipe = self.redis_ins.pipeline(transaction=False)
+        for msg in msgs:
+            pipe.xadd(
+                self.key,
+                {"data": self.codec.encode(msg)},
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+        return [msg_id.decode() for msg_id in pipe.execute()]
+
+    def consume(self, count: int = 1, timeout: float | None = None) -> list:
+        """Возвращает до count пар (id, сообщение); каждое нужно подтвердить ack.
 
-    def consume(self) -> dict:
-        msg = self.redis_ins.lpop(self.key)
-        return json.loads(msg)
+        Сначала забираются зависшие сообщения, затем новые. При timeout
+        ждёт новые сообщения не дольше timeout секунд, но только если
+        зависших не нашлось: найденные отдаются сразу.
+        """
+        messages = []
+        if time.monotonic() - self.last_reclaim >= self.reclaim_interval:
+            messages = self.reclaim(count)
+
+        if len(messages) < count:
+            response = self.redis_ins.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.key: ">"},
+                count=count - len(messages),
+                block=None if messages or timeout is None else int(timeout * 1000),
+            )
+            for _, entries in response or []:
+                messages.extend(entries)
+
+        return [
+            (msg_id.decode(), decode_message(fields[b"data"]))
+            for msg_id, fields in messages
+        ]
+
+    def reclaim(self, count: int) -> list:
+        self.last_reclaim = time.monotonic()
+        cursor, entries = self.reclaim_script(
+            keys=[self.key],
+            args=[
+                self.group,
+                self.consumer,
+                self.visibility_ms,
+                self.claim_cursor,
+                count,
+            ],
+        )
+        self.claim_cursor = cursor.decode()
+
+        claimed, deliveries = [], {}
+        for msg_id, fields, times_delivered in entries:
+            claimed.append((msg_id, dict(zip(fields[::2], fields[1::2]))))
+            deliveries[msg_id] = times_delivered
+
+        alive, dead = [], []
+        for msg_id, fields in claimed:
+            if deliveries[msg_id] > self.max_deliveries:
+                dead.append((msg_id, fields))
+            else:
+                alive.append((msg_id, fields))
+        if dead:
+            self.dead_letter(dead, deliveries)
+        return alive
+
+    def dead_letter(self, entries: list, deliveries: dict):
+        pipe = self.redis_ins.pipeline(transaction=True)
+        for msg_id, fields in entries:
+            pipe.xadd(
+                self.dead_letter_key,
+                {
+                    "data": fields[b"data"],
+                    "id": msg_id,
+                    "deliveries": deliveries[msg_id],
+                },
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+        pipe.xack(self.key, self.group, *(msg_id for msg_id, _ in entries))
+        pipe.execute()
+
+    def ack(self, *msg_ids: str) -> int:
+        if not msg_ids:
+            return 0
+        return self.redis_ins.xack(self.key, self.group, *msg_ids)
+
+    def pending_count(self) -> int:
+        return self.redis_ins.xpending(self.key, self.group)["pending"]
 
 
 if __name__ == "__main__":
@@ -26,3 +250,61 @@ if __name__ == "__main__":
     assert q.consume() == {"a": 1}
     assert q.consume() == {"b": 2}
     assert q.consume() == {"c": 3}
+
+    assert q.consume() is None
+    assert q.consume(timeout=0.1) is None
+
+    q.publish_many([{"n": i} for i in range(5)])
+    assert len(q) == 5
+    assert q.consume_many(3) == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert q.consume_many(10, timeout=0.1) == [{"n": 3}, {"n": 4}]
+    assert q.consume_many(10) == []
+
+    # старое сообщение и сжатое новым кодеком читаются одной очередью
+    zq = RedisQueue(redis_obj, codec=MessageCodec(compression="zlib"))
+    redis_obj.rpush(zq.key, '{"legacy": true}')
+    zq.publish({"data": "x" * 4096})
+    assert zq.consume_many(2) == [{"legacy": True}, {"data": "x" * 4096}]
+
+    rq = ReliableRedisQueue(
+        redis_obj,
+        key="queue1:stream:demo",
+        consumer="demo-1",
+        visibility_timeout=0.2,
+        max_deliveries=2,
+    )
+    redis_obj.delete(rq.key, rq.dead_letter_key)
+    rq.ensure_group()
+    rq.publish_many([{"n": 1}, {"n": 2}])
+
+    # первое сообщение обработано, второе "потеряно" упавшим консьюмером
+    (first_id, first), (lost_id, lost) = rq.consume(count=2)
+    assert first == {"n": 1} and lost == {"n": 2}
+    rq.ack(first_id)
+
+    other = ReliableRedisQueue(
+        redis_obj,
+        key=rq.key,
+        consumer="demo-2",
+        visibility_timeout=0.2,
+        max_deliveries=2,
+    )
+    time.sleep(0.25)
+    assert other.consume() == [(lost_id, {"n": 2})]
+
+    # после max_deliveries сообщение уходит в dead-letter стрим
+    time.sleep(0.25)
+    other.last_reclaim = 0.0
+    assert other.consume(timeout=0.05) == []
+    assert redis_obj.xlen(rq.dead_letter_key) == 1
+    assert other.pending_count() == 0
+
+    # сообщение удалили из стрима, пока оно висело в PEL
+    rq.publish({"n": 3})
+    ((removed_id, _),) = rq.consume()
+    redis_obj.xdel(rq.key, removed_id)
+    time.sleep(0.25)
+    other.last_reclaim = 0.0
+    assert other.consume(timeout=0.05) == []
+    assert other.pending_count() == 0
+    redis_obj.delete(rq.key, rq.dead_letter_key)
@@ -0,0 +1,54 @@
+import json
+import time
+
+from config import redis_obj
+from task_queue import RedisQueue
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def make_messages(count: int) -> list[dict]:
+    return [{"id": i, "payload": "x" * 64} for i in range(count)]
+
+
+def bench_batch(queue: RedisQueue, msgs: list[dict], batch_size: int) -> dict:
+    start = time.perf_counter()
+    if batch_size == 1:
+        for msg in msgs:
+            queue.publish(msg)
+    else:
+        for i in range(0, len(msgs), batch_size):
+            queue.publish_many(msgs[i : i + batch_size])
+    publish_elapsed = time.perf_counter() - start
+
+    consumed = 0
+    start = time.perf_counter()
+    while consumed < len(msgs):
+        if batch_size == 1:
+            queue.consume()
+            consumed += 1
+        else:
+            consumed += len(queue.consume_many(batch_size))
+    consume_elapsed = time.perf_counter() - start
+
+    return {
+        "publish_msgs_per_sec": round(len(msgs) / publish_elapsed),
+        "consume_msgs_per_sec": round(len(msgs) / consume_elapsed),
+    }
+
+
+def benchmark(messages: int = 10000) -> dict:
+    queue = RedisQueue(redis_obj, key="bench:queue")
+    redis_obj.delete(queue.key)
+    msgs = make_messages(messages)
+    try:
+        return {
+            f"batch_{batch_size}": bench_batch(queue, msgs, batch_size)
+            for batch_size in BATCH_SIZES
+        }
+    finally:
+        redis_obj.delete(queue.key)
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,77 @@
+import json
+import random
+import string
+import time
+
+from config import redis_obj
+from message_codecs import MessageCodec, decode_message, msgpack
+
+KEY = "bench:codecs"
+
+
+def make_payloads() -> dict:
+    rnd = random.Random(1)
+    words = ["".join(rnd.choices(string.ascii_lowercase, k=8)) for _ in range(200)]
+    return {
+        "small": {"id": 42, "event": "created", "ts": 1700000000.5},
+        "records": {
+            "items": [
+                {
+                    "sku": f"SKU-{i:05d}",
+                    "qty": rnd.randint(1, 10),
+                    "price": round(rnd.uniform(1, 500), 2),
+                    "tags": rnd.sample(words, 3),
+                }
+                for i in range(200)
+            ]
+        },
+        "numbers": {"values": [rnd.random() for _ in range(2000)]},
+        "text": {"body": " ".join(rnd.choices(words, k=8000))},
+    }
+
+
+def make_codecs() -> dict:
+    codecs = {
+        "json": MessageCodec(),
+        "json+zlib": MessageCodec(compression="zlib"),
+        "json+lzma": MessageCodec(compression="lzma"),
+    }
+    if msgpack is not None:
+        codecs["msgpack"] = MessageCodec("msgpack")
+        codecs["msgpack+zlib"] = MessageCodec("msgpack", "zlib")
+    return codecs
+
+
+def per_call_us(func, arg, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return round((time.perf_counter() - start) / repeat * 1e6, 1)
+
+
+def stored_bytes(encoded: bytes, count: int = 200) -> int:
+    # память Redis на сообщение в списке, с учётом накладных расходов
+    redis_obj.delete(KEY)
+    redis_obj.rpush(KEY, *([encoded] * count))
+    usage = redis_obj.memory_usage(KEY, samples=0)
+    redis_obj.delete(KEY)
+    return usage // count
+
+
+def benchmark(repeat: int = 200) -> dict:
+    report = {}
+    for payload_name, payload in make_payloads().items():
+        for codec_name, codec in make_codecs().items():
+            encoded = codec.encode(payload)
+            assert decode_message(encoded) == payload
+            report[f"{payload_name}/{codec_name}"] = {
+                "encode_us": per_call_us(codec.encode, payload, repeat),
+                "decode_us": per_call_us(decode_message, encoded, repeat),
+                "message_bytes": len(encoded),
+                "redis_bytes": stored_bytes(encoded),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
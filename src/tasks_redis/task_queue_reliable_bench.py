@@ -0,0 +1,109 @@
+import json
+import multiprocessing
+import time
+
+from config import redis_obj
+from task_queue import ReliableRedisQueue
+
+KEY = "bench:stream"
+
+
+def make_queue(consumer: str, visibility_timeout: float = 30.0) -> ReliableRedisQueue:
+    return ReliableRedisQueue(
+        redis_obj,
+        key=KEY,
+        consumer=consumer,
+        visibility_timeout=visibility_timeout,
+    )
+
+
+def consumer_loop(name: str, batch_size: int, done):
+    queue = make_queue(name)
+    consumed = 0
+    finished_at = time.time()
+    while True:
+        messages = queue.consume(count=batch_size, timeout=0.2)
+        if not messages:
+            break
+        queue.ack(*(msg_id for msg_id, _ in messages))
+        consumed += len(messages)
+        finished_at = time.time()
+    done.put((consumed, finished_at))
+
+
+def bench_throughput(messages: int, consumers: int, batch_size: int) -> dict:
+    redis_obj.delete(KEY)
+    queue = make_queue("publisher")
+    msgs = [{"id": i, "payload": "x" * 64} for i in range(messages)]
+    start = time.perf_counter()
+    for i in range(0, messages, 1000):
+        queue.publish_many(msgs[i : i + 1000])
+    publish_elapsed = time.perf_counter() - start
+
+    done = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=consumer_loop, args=(f"bench-{i}", batch_size, done)
+        )
+        for i in range(consumers)
+    ]
+    start = time.time()
+    for process in processes:
+        process.start()
+    results = [done.get() for _ in processes]
+    consumed = sum(count for count, _ in results)
+    # до последнего подтверждённого сообщения, без финального пустого ожидания
+    consume_elapsed = max(finished_at for _, finished_at in results) - start
+    for process in processes:
+        process.join()
+
+    assert consumed == messages, consumed
+    assert queue.pending_count() == 0
+    return {
+        "publish_msgs_per_sec": round(messages / publish_elapsed),
+        "consume_msgs_per_sec": round(messages / consume_elapsed),
+    }
+
+
+def crashing_consumer(count: int):
+    # забирает сообщения и "падает", не подтвердив их
+    make_queue("crashed").consume(count=count)
+
+
+def bench_redelivery(messages: int = 100, visibility_timeout: float = 1.0) -> dict:
+    redis_obj.delete(KEY)
+    make_queue("publisher").publish_many([{"id": i} for i in range(messages)])
+
+    process = multiprocessing.Process(target=crashing_consumer, args=(messages,))
+    process.start()
+    process.join()
+    crashed_at = time.perf_counter()
+
+    queue = make_queue("rescuer", visibility_timeout)
+    redelivered = 0
+    while redelivered < messages:
+        redelivered += len(queue.consume(count=messages, timeout=0.05))
+    latency = time.perf_counter() - crashed_at
+    return {
+        "visibility_timeout_sec": visibility_timeout,
+        "redelivery_latency_sec": round(latency, 3),
+    }
+
+
+def benchmark(messages: int = 10000) -> dict:
+    try:
+        report = {
+            f"consumers_{consumers}_batch_{batch_size}": bench_throughput(
+                messages, consumers, batch_size
+            )
+            for consumers in (1, 4)
+            for batch_size in (1, 100)
+        }
+        report["redelivery"] = bench_redelivery()
+        return report
+    finally:
+        redis_obj.delete(KEY, f"{KEY}:dead")
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
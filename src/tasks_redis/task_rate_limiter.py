@@ -1,61 +1,435 @@
+import asyncio
 import random
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 import redis
-from config import redis_obj
+from config import async_redis_obj, redis_obj
+
+# Скользящее окно: одна запись ZSET на запрос. Время берётся из Redis,
+# чтобы расхождение часов клиентов не влияло на окно.
+SLIDING_WINDOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local member = ARGV[4]
+
+local retry_after = 0
+for _, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local count = redis.call('ZCARD', key)
+    if count >= limit then
+        local index = count - limit
+        local item = redis.call('ZRANGE', key, index, index, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(item[2]) + window - now)
+    end
+end
+if retry_after > 0 then
+    return {0, 0, tostring(retry_after)}
+end
+
+local remaining = limit
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, ttl)
+    remaining = math.min(remaining, limit - redis.call('ZCARD', key))
+end
+return {1, remaining, '0'}
+"""
+
+# GCRA: на ключ хранится одно число - теоретическое время прихода (TAT).
+# Запрос разрешён, если после сдвига TAT на interval он не уходит
+# дальше now + window; это даёт те же limit запросов за окно.
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local window = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+
+local retry_after = 0
+local new_tats = {}
+for i, key in ipairs(KEYS) do
+    local tat = math.max(tonumber(redis.call('GET', key)) or now, now)
+    new_tats[i] = tat + interval
+    retry_after = math.max(retry_after, new_tats[i] - window - now)
+end
+if retry_after > 0 then
+    return {0, 0, tostring(retry_after)}
+end
+
+local remaining = nil
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(new_tats[i]), 'PX', math.ceil(new_tats[i] - now))
+    local left = math.floor((now + window - new_tats[i]) / interval)
+    remaining = remaining and math.min(remaining, left) or left
+end
+return {1, remaining, '0'}
+"""
+
+# Аренда пачки разрешений: TAT сдвигается сразу на granted * interval.
+# Третье значение - через сколько мс освободится последний слот пачки.
+GCRA_LEASE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local window = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local available = math.floor((now + window - tat) / interval)
+local granted = math.max(0, math.min(wanted, available))
+if granted > 0 then
+    tat = tat + granted * interval
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+end
+-- когда можно будет арендовать полную пачку
+return {
+    granted,
+    tostring(math.max(0, tat + wanted * interval - window - now)),
+    tostring(math.max(0, tat - now)),
+}
+"""
+
+# Возврат неиспользованных разрешений: TAT сдвигается назад, но не раньше now.
+GCRA_RETURN_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local interval = tonumber(ARGV[1])
+local count = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat then
+    return 0
+end
+tat = tat - count * interval
+if tat <= now then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+end
+return 1
+"""
 
 
 class RateLimitExceed(Exception):
-    pass
+    def __init__(self, retry_after: float = 0.0):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float
 
 
 class RateLimiter:
+    """Ограничение limit запросов за window_seconds.
+
+    algorithm="sliding_window" - точное скользящее окно, память O(limit) на ключ;
+    algorithm="gcra" - GCRA, одно число на ключ.
+    Проверка делается одним Lua-скриптом, без WATCH и повторов.
+    """
+
+    ALGORITHMS = ("sliding_window", "gcra")
+
     def __init__(
         self,
         redis_client: redis.Redis,
         key: str = "ratelimit:global",
         window_seconds: float = 3.0,
         limit: int = 5,
+        algorithm: str = "sliding_window",
     ):
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unknown algorithm {algorithm!r}")
         self.redis_client = redis_client
         self.key = key
         self.window_ms = int(window_seconds * 1000)
         self.limit = int(limit)
         self.ttl_ms = int(self.window_ms * 2)
+        self.algorithm = algorithm
+        if algorithm == "gcra":
+            self.script = redis_client.register_script(GCRA_SCRIPT)
+        else:
+            self.script = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
 
-    def test(self) -> bool:
-        now = int(time.time() * 1000)
-        pipe = self.redis_client.pipeline()
-        while True:
+    def make_keys(self, subkeys) -> list[str]:
+        if not subkeys:
+            return [self.key]
+        return [f"{self.key}:{subkey}" for subkey in subkeys]
+
+    def check(self, *subkeys: str) -> RateLimitResult:
+        """Проверяет и при успехе учитывает запрос сразу по всем ключам.
+
+        check("user:1", "global") пропускает запрос, только если лимит
+        не исчерпан ни по одному ключу. Без аргументов используется self.key.
+        """
+        response = self.script(keys=self.make_keys(subkeys), args=self.script_args())
+        return self.make_result(response)
+
+    def script_args(self) -> list:
+        if self.algorithm == "gcra":
+            return [self.window_ms, self.window_ms / self.limit]
+        member = f"{time.time_ns()}-{random.getrandbits(32)}"
+        return [self.window_ms, self.limit, self.ttl_ms, member]
+
+    @staticmethod
+    def make_result(response) -> RateLimitResult:
+        allowed, remaining, retry_after = response
+        return RateLimitResult(
+            allowed=bool(allowed),
+            remaining=int(remaining),
+            retry_after=float(retry_after) / 1000,
+        )
+
+    def test(self, *subkeys: str) -> bool:
+        return self.check(*subkeys).allowed
+
+
+class AsyncRateLimiter(RateLimiter):
+    """RateLimiter поверх клиента redis.asyncio: те же скрипты, без блокировки цикла."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # блокировки удаляются сами, когда ключ больше никто не ждёт
+        self.waiters: weakref.WeakValueDictionary[tuple, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+
+    async def check(self, *subkeys: str) -> RateLimitResult:
+        response = await self.script(
+            keys=self.make_keys(subkeys), args=self.script_args()
+        )
+        return self.make_result(response)
+
+    async def test(self, *subkeys: str) -> bool:
+        return (await self.check(*subkeys)).allowed
+
+    async def acquire(self, *subkeys: str, timeout: float | None = None):
+        """Ждёт разрешения; RateLimitExceed, если не дождались за timeout.
+
+        Ожидающие одного ключа выстраиваются в очередь на asyncio.Lock,
+        и Redis опрашивает только первый из них, а не все разом.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        lock = self.waiters.get(subkeys)
+        if lock is None:
+            lock = self.waiters[subkeys] = asyncio.Lock()
+
+        if timeout is None:
+            await lock.acquire()
+        else:
             try:
-                pipe.watch(self.key)
-                pipe.zremrangebyscore(self.key, "-inf", now - self.window_ms)
-                count = pipe.zcard(self.key)
-                if count >= self.limit:
-                    pipe.unwatch()
-                    return False
-                member = f"{now}-{random.getrandbits(32)}"
-                pipe.multi()
-                pipe.zadd(self.key, {member: now})
-                pipe.pexpire(self.key, self.window_ms * 2)
-                pipe.execute()
-                return True
-            except redis.WatchError:
-                now = int(time.time() * 1000)
-                continue
-            finally:
-                pipe.reset()
+                await asyncio.wait_for(lock.acquire(), max(timeout, 0.001))
+            except asyncio.TimeoutError:
+                raise RateLimitExceed(timeout) from None
+        try:
+            while True:
+                result = await self.check(*subkeys)
+                if result.allowed:
+                    return result
+                now = time.monotonic()
+                if deadline is not None and now + result.retry_after > deadline:
+                    raise RateLimitExceed(result.retry_after)
+                await asyncio.sleep(result.retry_after)
+        finally:
+            lock.release()
+
+
+class LeasedRateLimiter(RateLimiter):
+    """GCRA-лимитер, который арендует у Redis пачки по lease_size разрешений
+    и раздаёт их локально, без обращения к Redis на каждый запрос.
+
+    Когда остаётся refill_at * lease_size разрешений, следующая пачка
+    запрашивается в фоне; пока она в пути, check() ждёт её, а не арендует
+    вторую. Неиспользованные разрешения сгорают через lease_seconds и
+    при close(). В Redis возвращаются только те из них, чьи слоты GCRA
+    ещё не освободил сам: при lease_seconds >= window_seconds к моменту
+    сгорания освобождены все. Разрешения учитываются в момент аренды,
+    поэтому в окне можно превысить limit не более чем на lease_size
+    на процесс.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key: str = "ratelimit:global",
+        window_seconds: float = 3.0,
+        limit: int = 5,
+        lease_size: int = 10,
+        refill_at: float = 0.5,
+        lease_seconds: float | None = None,
+    ):
+        super().__init__(redis_client, key, window_seconds, limit, algorithm="gcra")
+        self.lease_size = min(lease_size, self.limit)
+        self.refill_threshold = int(self.lease_size * refill_at)
+        self.lease_seconds = window_seconds if lease_seconds is None else lease_seconds
+        self.interval_ms = self.window_ms / self.limit
+        self.lease_script = redis_client.register_script(GCRA_LEASE_SCRIPT)
+        self.return_script = redis_client.register_script(GCRA_RETURN_SCRIPT)
+
+        self.lock = threading.Lock()
+        self.permits = 0
+        self.expires_at = 0.0
+        # последняя пачка: сколько дали и когда её слоты освободятся в Redis
+        self.last_granted = 0
+        self.drains_at = 0.0
+        # до этого момента полную пачку не дадут, отказываем локально
+        self.retry_at = 0.0
+        self.refilling = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.redis_calls = 0
+
+    def lease(self) -> tuple[int, float, float]:
+        self.redis_calls += 1
+        granted, retry_after, drain_after = self.lease_script(
+            keys=[self.key], args=[self.window_ms, self.interval_ms, self.lease_size]
+        )
+        return granted, float(retry_after) / 1000, float(drain_after) / 1000
+
+    def apply_lease(self, granted: int, retry_after: float, drain_after: float):
+        now = time.monotonic()
+        if granted:
+            # новая пачка продлевает срок и уже выданных разрешений
+            self.permits += granted
+            self.expires_at = now + self.lease_seconds
+            self.last_granted = granted
+            self.drains_at = now + drain_after
+        # при нехватке разрешений следующая аренда - когда наберётся пачка
+        self.retry_at = now + retry_after
+
+    def returnable(self, now: float) -> int:
+        # слоты пачек уходят из GCRA по очереди; ещё не ушедшие слоты
+        # последней пачки точно наши, их и можно вернуть
+        pending = int((self.drains_at - now) * 1000 / self.interval_ms)
+        return max(0, min(self.permits, self.last_granted, pending))
+
+    def give_back(self, count: int):
+        self.redis_calls += 1
+        self.return_script(keys=[self.key], args=[self.interval_ms, count])
+
+    def expire(self, now: float):
+        count = self.returnable(now)
+        if count:
+            self.executor.submit(self.give_back, count)
+        self.permits = 0
+        self.last_granted = 0
+
+    def refill(self):
+        try:
+            if time.monotonic() >= self.retry_at:
+                # запрос к Redis вне блокировки: локальная раздача не ждёт его
+                lease = self.lease()
+                with self.lock:
+                    self.apply_lease(*lease)
+        finally:
+            with self.lock:
+                self.refilling = None
+
+    def check(self, *subkeys: str) -> RateLimitResult:
+        if subkeys:
+            # аренда работает только по основному ключу
+            return super().check(*subkeys)
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.expires_at and self.permits:
+                    self.expire(now)
+                refilling = self.refilling
+                if self.permits or now < self.retry_at or refilling is None:
+                    return self.take(now)
+            # пачку уже арендует фон: вторая аренда удвоила бы возможное
+            # превышение limit, поэтому ждём её вне блокировки
+            refilling.result()
+
+    def take(self, now: float) -> RateLimitResult:
+        # вызывается под self.lock
+        if not self.permits and now >= self.retry_at:
+            self.apply_lease(*self.lease())
+        if not self.permits:
+            return RateLimitResult(False, 0, max(0.0, self.retry_at - now))
+
+        self.permits -= 1
+        if self.permits <= self.refill_threshold and self.refilling is None:
+            self.refilling = self.executor.submit(self.refill)
+        return RateLimitResult(True, self.permits, 0.0)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            count = self.returnable(time.monotonic())
+            if count:
+                self.give_back(count)
+            self.permits = 0
+            self.last_granted = 0
 
 
 def make_api_request(rate_limiter: RateLimiter):
-    if not rate_limiter.test():
-        raise RateLimitExceed
+    result = rate_limiter.check()
+    if not result.allowed:
+        raise RateLimitExceed(result.retry_after)
     else:
         # какая-то бизнес логика
         pass
 
 
 if __name__ == "__main__":
+    for algorithm in RateLimiter.ALGORITHMS:
+        limiter = RateLimiter(
+            redis_obj,
+            key=f"ratelimit:demo:{algorithm}",
+            window_seconds=1.0,
+            limit=5,
+            algorithm=algorithm,
+        )
+        redis_obj.delete(*limiter.make_keys(["user:1", "user:2"]))
+
+        results = [limiter.check("user:1") for _ in range(6)]
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert results[0].remaining == 4
+        assert 0 < results[-1].retry_after <= 1.0
+        # у другого пользователя свой лимит
+        assert limiter.test("user:2")
+
+        time.sleep(results[-1].retry_after + 0.01)
+        assert limiter.test("user:1")
+
+    leased = LeasedRateLimiter(
+        redis_obj, key="ratelimit:demo:leased", window_seconds=1.0, limit=20
+    )
+    redis_obj.delete(leased.key)
+    allowed = sum(leased.test() for _ in range(30))
+    assert allowed == 20, allowed
+    assert leased.redis_calls <= 4, leased.redis_calls
+    leased.close()
+
+    async def acquire_demo():
+        limiter = AsyncRateLimiter(
+            async_redis_obj, key="ratelimit:demo:async", window_seconds=1.0, limit=10
+        )
+        await async_redis_obj.delete(limiter.key)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(20)))
+        # вторые 10 разрешений появляются только в следующем окне
+        assert 0.9 <= time.monotonic() - start < 2.0
+        try:
+            await limiter.acquire(timeout=0.01)
+        except RateLimitExceed:
+            pass
+        else:
+            raise AssertionError("acquire should time out")
+        await async_redis_obj.aclose()
+
+    asyncio.run(acquire_demo())
+
     rate_limiter = RateLimiter(redis_obj)
 
     for _ in range(50):
@@ -0,0 +1,108 @@
+import json
+import multiprocessing
+import random
+import time
+
+import redis
+from config import redis_obj
+from task_rate_limiter import RateLimiter
+
+KEY = "bench:ratelimit"
+
+
+class WatchRateLimiter(RateLimiter):
+    """Прежняя реализация на WATCH/MULTI, для сравнения."""
+
+    retries = 0
+
+    def test(self, *subkeys: str) -> bool:
+        key = self.make_keys(subkeys)[0]
+        now = int(time.time() * 1000)
+        pipe = self.redis_client.pipeline()
+        while True:
+            try:
+                pipe.watch(key)
+                pipe.zremrangebyscore(key, "-inf", now - self.window_ms)
+                count = pipe.zcard(key)
+                if count >= self.limit:
+                    pipe.unwatch()
+                    return False
+                member = f"{now}-{random.getrandbits(32)}"
+                pipe.multi()
+                pipe.zadd(key, {member: now})
+                pipe.pexpire(key, self.window_ms * 2)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                self.retries += 1
+                now = int(time.time() * 1000)
+                continue
+            finally:
+                pipe.reset()
+
+
+def make_limiter(algorithm: str, limit: int) -> RateLimiter:
+    if algorithm == "watch":
+        return WatchRateLimiter(redis_obj, key=KEY, window_seconds=1.0, limit=limit)
+    return RateLimiter(
+        redis_obj, key=KEY, window_seconds=1.0, limit=limit, algorithm=algorithm
+    )
+
+
+def client(algorithm: str, limit: int, checks: int, users: int, results):
+    limiter = make_limiter(algorithm, limit)
+    allowed = 0
+    start = time.perf_counter()
+    for i in range(checks):
+        allowed += limiter.test(f"user:{i % users}")
+    elapsed = time.perf_counter() - start
+    results.put((allowed, elapsed, getattr(limiter, "retries", 0)))
+
+
+def run(algorithm: str, clients: int, checks: int, limit: int, users: int) -> dict:
+    redis_obj.delete(
+        *make_limiter(algorithm, limit).make_keys([f"user:{i}" for i in range(users)])
+    )
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=client, args=(algorithm, limit, checks, users, results)
+        )
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    elapsed = max(item[1] for item in collected)
+    report = {
+        "checks_per_sec": round(clients * checks / elapsed),
+        "allowed": sum(item[0] for item in collected),
+    }
+    if algorithm == "watch":
+        report["watch_retries"] = sum(item[2] for item in collected)
+    report["redis_bytes"] = sum(
+        redis_obj.memory_usage(key, samples=0) or 0
+        for key in redis_obj.scan_iter(f"{KEY}*")
+    )
+    return report
+
+
+def benchmark(clients: int = 8, checks: int = 2000) -> dict:
+    report = {}
+    for algorithm in ("watch", "sliding_window", "gcra"):
+        # один общий ключ с большим лимитом - максимальная конкуренция
+        report[f"{algorithm}/shared_key"] = run(
+            algorithm, clients, checks, limit=10**6, users=1
+        )
+        # 100 пользователей по 50 запросов в секунду
+        report[f"{algorithm}/per_user"] = run(
+            algorithm, clients, checks, limit=50, users=100
+        )
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,84 @@
+import json
+import multiprocessing
+import time
+
+from config import redis_obj
+from task_rate_limiter import LeasedRateLimiter, RateLimiter
+
+KEY = "bench:ratelimit:lease"
+
+
+def make_limiter(mode: str, limit: int, lease_size: int) -> RateLimiter:
+    if mode == "leased":
+        return LeasedRateLimiter(
+            redis_obj, key=KEY, window_seconds=1.0, limit=limit, lease_size=lease_size
+        )
+    return RateLimiter(
+        redis_obj, key=KEY, window_seconds=1.0, limit=limit, algorithm="gcra"
+    )
+
+
+def client(mode: str, limit: int, lease_size: int, duration: float, results):
+    limiter = make_limiter(mode, limit, lease_size)
+    latencies = []
+    allowed = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        allowed += limiter.test()
+        latencies.append(time.perf_counter() - start)
+    if mode == "leased":
+        limiter.close()
+    latencies.sort()
+    results.put((len(latencies), allowed, latencies[int(len(latencies) * 0.99)]))
+
+
+def commands_processed() -> int:
+    return redis_obj.info("stats")["total_commands_processed"]
+
+
+def run(mode: str, clients: int, limit: int, lease_size: int, duration: float):
+    redis_obj.delete(KEY)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=client, args=(mode, limit, lease_size, duration, results)
+        )
+        for _ in range(clients)
+    ]
+    commands_before = commands_processed()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    # минус сам вызов INFO
+    commands = commands_processed() - commands_before - 1
+
+    checks = sum(item[0] for item in collected)
+    allowed = sum(item[1] for item in collected)
+    return {
+        "checks_per_sec": round(checks / duration),
+        "redis_ops_per_sec": round(commands / duration),
+        "redis_ops_per_check": round(commands / checks, 4),
+        "p99_check_us": round(max(item[2] for item in collected) * 1e6, 1),
+        # GCRA пропускает limit за первое окно и дальше limit в секунду
+        "allowed": allowed,
+        "allowed_over_ideal": allowed - round(limit * (duration + 1)),
+    }
+
+
+def benchmark(clients: int = 4, duration: float = 3.0) -> dict:
+    report = {}
+    # лимит выше нагрузки и лимит, в который нагрузка упирается
+    for limit in (100_000, 10_000):
+        report[f"limit_{limit}/gcra"] = run("gcra", clients, limit, 0, duration)
+        for lease_size in (10, 100, 1000):
+            report[f"limit_{limit}/leased_{lease_size}"] = run(
+                "leased", clients, limit, lease_size, duration
+            )
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
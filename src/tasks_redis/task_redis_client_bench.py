@@ -0,0 +1,146 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import config
+import redis
+from config import command_stats, enable_instrumentation, get_redis, redis_obj
+from task_distributed_lock import single
+from task_queue import RedisQueue, ReliableRedisQueue
+from task_rate_limiter import RateLimiter
+
+KEY_PREFIX = "bench:client"
+
+IMPORT_CODE = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def import_time(module: str, env: dict, runs: int = 5) -> float:
+    """Медиана времени импорта модуля в новом интерпретаторе, мс."""
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CODE.format(module=module)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        times.append(float(output) * 1000)
+    return round(sorted(times)[runs // 2], 1)
+
+
+def import_report() -> dict:
+    env = dict(os.environ)
+    env_without_url = {k: v for k, v in env.items() if k != "REDIS_URL"}
+    return {
+        "redis_ms": import_time("redis", env),
+        "config_ms": import_time("config", env),
+        # без REDIS_URL модуль импортируется, ошибка будет при первой команде
+        "config_without_redis_url_ms": import_time("config", env_without_url),
+        "task_queue_ms": import_time("task_queue", env),
+    }
+
+
+def per_command_us(client, commands: int = 10000, rounds: int = 3) -> float:
+    """Лучшее из rounds среднее время PING, мкс: на одном CPU шумно."""
+    client.ping()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(commands):
+            client.ping()
+        best = min(best, time.perf_counter() - start)
+    return round(best / commands * 1e6, 1)
+
+
+def check_fork():
+    parent = get_redis()
+    parent.ping()
+    pid = os.fork()
+    if pid == 0:
+        child = get_redis()
+        os._exit(0 if child is not parent and child.ping() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert get_redis() is parent
+
+
+def queue_workload():
+    queue = RedisQueue(redis_obj, key=f"{KEY_PREFIX}:queue")
+    redis_obj.delete(queue.key)
+    for i in range(200):
+        queue.publish({"id": i})
+    queue.publish_many([{"id": i} for i in range(1000)])
+    while queue.consume_many(100):
+        pass
+
+    reliable = ReliableRedisQueue(redis_obj, key=f"{KEY_PREFIX}:stream")
+    redis_obj.delete(reliable.key)
+    reliable.ensure_group()
+    reliable.publish_many([{"id": i} for i in range(500)])
+    while batch := reliable.consume(count=50):
+        reliable.ack(*(message_id for message_id, _ in batch))
+    redis_obj.delete(reliable.key)
+
+
+def lock_workload():
+    @single(datetime.timedelta(seconds=10), redis_client=redis_obj)
+    def critical_section():
+        time.sleep(0.001)
+
+    def worker():
+        for _ in range(20):
+            critical_section()
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def rate_limiter_workload():
+    limiter = RateLimiter(
+        redis_obj, key=f"{KEY_PREFIX}:limiter", window_seconds=1.0, limit=100
+    )
+    redis_obj.delete(limiter.key)
+    for _ in range(500):
+        limiter.check()
+
+
+def benchmark() -> dict:
+    url = config.get_redis_url()
+    report = {"import": import_report()}
+
+    check_fork()
+
+    report["per_command_us"] = {
+        "redis_from_url": per_command_us(redis.Redis.from_url(url)),
+        "lazy_pooled": per_command_us(redis_obj),
+    }
+    enable_instrumentation()
+    report["per_command_us"]["lazy_pooled_instrumented"] = per_command_us(redis_obj)
+
+    report["modules"] = {}
+    for name, workload in (
+        ("queue", queue_workload),
+        ("lock", lock_workload),
+        ("rate_limiter", rate_limiter_workload),
+    ):
+        command_stats.reset()
+        workload()
+        report["modules"][name] = command_stats.snapshot()
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))